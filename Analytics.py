@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 01:09:07 2026
+
+This module contains the Analytics object, which summarizes the cards of a
+Collection: its mana curve, color pips (counted from the mana costs),
+rarity, set and color distributions, and totals (cards, value and average
+mana value). Every aggregate is a weighted count, so the Analytics of a
+Collection can be updated by just the cards added or dropped (see
+Collection.analytics()), and those of several Collections can be added up
+without loading them again (see Library.analytics()).
+
+@author: Joe Raso
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from Cards import RARITY_ORDER, COLOR_ORDER
+
+# Colors counted as pips (C is colorless mana, e.g. {C})
+PIP_COLORS = 'WUBRGC'
+def cost_pips(cost):
+    """Returns the number of pips of each of PIP_COLORS in a mana cost string.
+    Hybrid and phyrexian symbols count toward each of their colors."""
+    pips = [0]*len(PIP_COLORS)
+    for symbol in re.findall(r'\{([^}]*)\}', cost):
+        for letter in set(symbol.split('/')):
+            if letter in PIP_COLORS: pips[PIP_COLORS.index(letter)] += 1
+    return pips
+
+class Analytics:
+    """Aggregates of a set of cards, each weighted by its number of copies:
+    total cards, value (of the cards with a price), mana curve and average
+    mana value (of the cards with a mana cost - so not lands), color pips,
+    and the number of cards per rarity, set and color."""
+    # The mana curve is kept up to this mana value (higher ones are counted
+    # with it)
+    maxmv = 16
+    # Pips of the mana costs seen so far
+    pipcache = {}
+    def __init__(self, collection=None):
+        self.cards = 0.0; self.value = 0.0; self.priced = 0.0
+        self.costed = 0.0; self.mvtotal = 0.0
+        self.curve = np.zeros(self.maxmv+1)
+        self.pips = np.zeros(len(PIP_COLORS))
+        self.counts = {column:pd.Series(dtype=float) for column in
+            ['Rarity', 'Set', 'Color']}
+        # The Collection version these are up to date with
+        self.version = None
+        if collection is not None:
+            self.add(collection); self.stamp(collection)
+
+    # Updating ================================================================
+    @staticmethod
+    def weights(frame):
+        """Returns the number of copies of each row of a frame of cards."""
+        if 'Qty' in frame.columns: return frame['Qty'].to_numpy(dtype=float)
+        return np.ones(len(frame))
+    def add(self, frame, weights=None):
+        """Adds cards (a frame following the Collection schema) to the
+        aggregates, counting each row (weights) times (by default, its
+        quantity). Negative weights remove cards."""
+        if weights is None: weights = self.weights(frame)
+        weights = np.asarray(weights, dtype=float)
+        self.cards += weights.sum()
+        if 'Price' in frame.columns:
+            price = frame['Price'].to_numpy(dtype=float)
+            known = ~np.isnan(price)
+            self.value += (price[known]*weights[known]).sum()
+            self.priced += weights[known].sum()
+        # Mana costs are categorical: pips are counted once per distinct cost
+        costs = frame['Cost'].cat.categories.astype(str)
+        codes = frame['Cost'].cat.codes.to_numpy()
+        percost = self.tally(codes, weights, len(costs))
+        self.pips += percost @ self.pip_matrix(costs)
+        costed = (codes >= 0) & np.append(costs != '', False)[codes]
+        mv = frame['MV'].to_numpy()[costed]
+        self.curve += np.bincount(np.clip(mv, 0, self.maxmv),
+            weights=weights[costed], minlength=self.maxmv+1)
+        self.costed += weights[costed].sum()
+        self.mvtotal += (mv*weights[costed]).sum()
+        for column, counts in self.counts.items():
+            values = frame[column].cat
+            self.counts[column] = counts.add(pd.Series(self.tally(
+                values.codes.to_numpy(), weights, len(values.categories)),
+                index=values.categories.astype(str)), fill_value=0)
+    @staticmethod
+    def tally(codes, weights, ncodes):
+        """Sums the weights of each (categorical) code, ignoring missing
+        values."""
+        known = codes >= 0
+        return np.bincount(codes[known], weights=weights[known],
+            minlength=ncodes)
+    @classmethod
+    def pip_matrix(cls, costs):
+        """Returns the pips of each of a list of mana costs, as a matrix."""
+        for cost in costs:
+            if cost not in cls.pipcache: cls.pipcache[cost] = cost_pips(cost)
+        return np.array([cls.pipcache[cost] for cost in costs],
+            dtype=float).reshape(len(costs), len(PIP_COLORS))
+    def stamp(self, collection):
+        """Marks the aggregates as up to date with the Collection."""
+        self.version = (collection.version, len(collection))
+    def current(self, collection):
+        """Whether the aggregates are up to date with the Collection."""
+        return self.version == (collection.version, len(collection))
+    @classmethod
+    def combine(cls, parts):
+        """Returns the Analytics of several sets of cards together."""
+        combined = cls()
+        for part in parts:
+            for field in ['cards', 'value', 'priced', 'costed', 'mvtotal',
+                    'curve', 'pips']:
+                setattr(combined, field, getattr(combined, field) +
+                    getattr(part, field))
+            for column, counts in part.counts.items():
+                combined.counts[column] = combined.counts[column].add(
+                    counts, fill_value=0)
+        return combined
+
+    # Results =================================================================
+    def mana_curve(self, top=7):
+        """Returns the number of cards (with a mana cost) at each mana value,
+        up to (top) and above (e.g. 0, 1, ... 6, '7+')."""
+        curve = self.curve.astype(int)
+        return pd.Series(list(curve[:top]) + [int(curve[top:].sum())],
+            index=list(range(top)) + [f"{top}+"])
+    def color_pips(self):
+        """Returns the number of pips of each color in the cards' costs."""
+        return pd.Series(self.pips.astype(int), index=list(PIP_COLORS))
+    def distribution(self, column):
+        """Returns the number of cards of each rarity, set or color (leaving
+        out those with none). Rarities and colors are in their usual order,
+        and sets from the most cards to the fewest."""
+        counts = self.counts[column]
+        counts = counts[counts > 0].astype(int)
+        if column == 'Set': return counts.sort_values(ascending=False,
+            kind='stable')
+        order = RARITY_ORDER if column == 'Rarity' else COLOR_ORDER
+        rank = {value:i for i, value in enumerate(order)}
+        return counts.iloc[np.argsort([rank.get(v, len(order)) for v in
+            counts.index], kind='stable')]
+    def totals(self):
+        """Returns the number of cards, their total value (of the cards with
+        a price) and their average mana value (of those with a cost)."""
+        return {'cards':int(self.cards), 'value':round(float(self.value), 2),
+            'priced':int(self.priced), 'average_mv':float(self.mvtotal/
+            self.costed) if self.costed else 0.0}
+    def summary(self):
+        """Returns all the results, as a (json-compatible) dictionary."""
+        summary = self.totals()
+        summary['mana_curve'] = {str(k):int(v) for k, v in
+            self.mana_curve().items()}
+        summary['color_pips'] = {k:int(v) for k, v in
+            self.color_pips().items()}
+        for column in self.counts:
+            summary[column.lower()] = {k:int(v) for k, v in
+                self.distribution(column).items()}
+        return summary
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 01:03:05 2026
+
+This module is ScrollRack's headless command line interface, for running
+operations over many Collection files at once (e.g. as a nightly job)
+without the GUI: converting between storage formats, sorting, refreshing
+card data from Scryfall, exporting to card list formats and merging. Each
+file is handled by one of a pool of worker processes, with a bounded number
+of files in flight and optionally a memory limit per worker. For example:
+
+    python Batch.py convert Library/ --to .feather --remove
+    python Batch.py sort Library/ --by Color MV Name
+    python Batch.py refresh Library/ --max-age 7
+    python Batch.py export Library/*.csv --to .dec --out Exports/
+    python Batch.py merge Library/ --out Everything.feather
+
+Only the worker processes import Collection (and with it pandas), and Qt is
+never imported, so the command itself starts almost instantly.
+
+@author: Joe Raso
+"""
+
+import os, sys, time, argparse
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+try: import resource
+except ImportError: resource = None # (not available on Windows)
+
+# The Collection storage extensions (as in Collection.formats, which isn't
+# imported here so that the command starts quickly)
+EXTENSIONS = ['.csv', '.feather', '.arrow', '.parquet']
+
+def collection_files(paths):
+    """Returns the Collection files given by a list of file and directory
+    paths (every Collection file directly inside each directory). If a
+    collection is stored in more than one format, only the first one found
+    is used."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path): files.append(path); continue
+        done = set()
+        for fname in sorted(os.listdir(path)):
+            root, ext = os.path.splitext(fname)
+            if ext.lower() in EXTENSIONS and not root.endswith(".tmp") \
+                    and root not in done:
+                done.add(root); files.append(os.path.join(path, fname))
+    return files
+
+# Per-file tasks (run in the worker processes) ================================
+def convert_file(fpath, ext, remove=False):
+    """Saves a Collection file in another storage format (by extension)."""
+    from Collection import Collection
+    root, old = os.path.splitext(fpath)
+    if old.lower() == ext: return "already converted"
+    collection = Collection.from_file(fpath)
+    collection.journal = None # (the new file is saved in full)
+    collection.save(root + ext)
+    if remove:
+        for path in [fpath, fpath + ".journal"]:
+            if os.path.exists(path): os.remove(path)
+    return f"saved {len(collection)} rows to {collection.fpath}"
+def saveable_file(fpath):
+    """Loads a Collection file to be changed and saved in place. (Other card
+    managers' csv exports are read, but never overwritten.)"""
+    from Collection import Collection
+    if Collection.is_export(fpath):
+        raise ValueError("not a Collection file (another card manager's "
+            "export), so it can't be saved in place")
+    return Collection.from_file(fpath)
+def sort_file(fpath, columns, ascending=True):
+    """Sorts a Collection file (in place) by a list of card properties."""
+    collection = saveable_file(fpath)
+    collection.sort_by(columns, ascending=ascending)
+    collection.save()
+    return f"sorted {len(collection)} rows"
+def refresh_file(fpath, max_age, prices=True):
+    """Refreshes the card data of a Collection file from Scryfall."""
+    collection = saveable_file(fpath)
+    summary = collection.refresh(max_age=max_age, prices=prices)
+    # (Rows refreshed with no changes still need their new refresh time)
+    if summary['refreshed']: collection.save()
+    return f"{summary['rows']} rows stale, {summary['refreshed']} " \
+        f"refreshed, {summary['updated']} updated, " \
+        f"{len(summary['not_found'])} not found"
+def export_file(fpath, ext, outdir):
+    """Writes the cards of a Collection file in another (e.g. card list)
+    format, to a file of the same name in outdir."""
+    from Collection import Collection
+    collection = Collection.from_file(fpath)
+    root = os.path.splitext(os.path.basename(fpath))[0]
+    outpath = os.path.join(outdir, root + ext)
+    Collection.write_data(collection.drop(columns=['Sel']), outpath)
+    return f"exported {collection.card_count()} cards to {outpath}"
+def collapse_file(fpath):
+    """Returns the cards of a Collection file in aggregated form (see
+    Collection.collapse()), as a DataFrame to be merged by the main
+    process."""
+    import pandas as pd
+    from Collection import Collection
+    collapsed = Collection.from_file(fpath).collapse()
+    # (A Collection's name and path don't survive being pickled)
+    return f"read {collapsed.card_count()} cards", pd.DataFrame(collapsed)
+
+# Running tasks across processes ==============================================
+def init_worker(memory=None, rate=None):
+    """Sets up a worker process: limits its memory (in MB), and its share
+    of the Scryfall request rate (requests/second)."""
+    if memory and resource is not None:
+        limit = memory*2**20
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    if rate:
+        from Search import ScryfallPortal, TokenBucket
+        ScryfallPortal.limiter = TokenBucket(rate=rate, capacity=1)
+def run_pool(task, jobs, workers=None, memory=None, per_worker=20,
+             rate=None, collect=None):
+    """Runs task(fpath, *args) for each (fpath, *args) job in a pool of
+    worker processes, printing the outcome of each. At most two jobs per
+    worker are in flight at a time, and workers are replaced after
+    (per_worker) jobs so that memory they hold on to is returned. Results
+    of tasks returning a (message, data) pair are passed to collect(data)
+    as they arrive. Returns the number of failed jobs."""
+    workers = workers or os.cpu_count() or 1
+    jobs = list(jobs); pending = set(); failures = 0; done = 0
+    options = {'max_tasks_per_child':per_worker} if \
+        sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+            initializer=init_worker, initargs=(memory, rate),
+            **options) as pool:
+        queued = iter(jobs)
+        while True:
+            for job in queued:
+                try: future = pool.submit(task, *job)
+                except BrokenProcessPool:
+                    # A worker died (e.g. at its memory limit), taking the
+                    # pool down with it
+                    failures += 1; done += 1
+                    print(f"[{done}/{len(jobs)}] {job[0]}: FAILED (worker "
+                        "pool stopped)", flush=True)
+                    continue
+                future.fpath = job[0]; pending.add(future)
+                if len(pending) >= 2*workers: break
+            if not pending: break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done += 1
+                try: result = future.result()
+                except Exception as error:
+                    failures += 1
+                    result = f"FAILED ({type(error).__name__}: {error})"
+                if isinstance(result, tuple):
+                    result, data = result
+                    if collect is not None: collect(data)
+                print(f"[{done}/{len(jobs)}] {future.fpath}: {result}",
+                    flush=True)
+    return failures
+def merge_files(files, outpath, **options):
+    """Merges the cards of many Collection files into one (aggregated)
+    Collection, saved to outpath. Returns the number of failed files."""
+    from Collection import Collection
+    parts = []
+    def collect(data):
+        # Merge as parts arrive, so that only the running total is held
+        collapsed = Collection(data); collapsed.name = "Merged"
+        if parts: parts[0] = parts[0].merge(collapsed)
+        else: parts.append(collapsed)
+    failures = run_pool(collapse_file, [(f,) for f in files],
+        collect=collect, **options)
+    if parts:
+        parts[0].save(outpath)
+        print(f"Saved {parts[0].card_count()} cards ({len(parts[0])} "
+            f"printings) to {outpath}")
+    return failures
+
+# Command line ================================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Runs ScrollRack "
+        "operations over many Collection files at once, without the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    def command(name, help):
+        sub = commands.add_parser(name, help=help)
+        sub.add_argument('paths', nargs='*', default=["Library/"],
+            help="Collection files and/or directories (default: Library/)")
+        sub.add_argument('--workers', type=int, help="number of worker "
+            "processes (default: one per core)")
+        sub.add_argument('--memory', type=int, metavar='MB',
+            help="memory limit per worker process")
+        sub.add_argument('--per-worker', type=int, default=20, help="files "
+            "handled by each worker process before it is replaced")
+        return sub
+    convert = command('convert', "save in another storage format")
+    convert.add_argument('--to', required=True, choices=EXTENSIONS)
+    convert.add_argument('--remove', action='store_true',
+        help="remove the original files")
+    sort = command('sort', "sort by one or more card properties")
+    sort.add_argument('--by', nargs='+', default=['Name'])
+    sort.add_argument('--descending', action='store_true')
+    refresh = command('refresh', "refresh card data and prices")
+    refresh.add_argument('--max-age', type=float, default=7,
+        help="refresh cards not refreshed for this many days")
+    refresh.add_argument('--no-prices', action='store_true')
+    export = command('export', "export to a card list format")
+    export.add_argument('--to', required=True,
+        help="extension of the format (e.g. .dec, .txt, .csv)")
+    export.add_argument('--out', default="Exports/",
+        help="directory to export to")
+    merge = command('merge', "merge into one aggregated Collection")
+    merge.add_argument('--out', required=True, help="file to save to")
+    return parser.parse_args(argv)
+def main(argv=None):
+    args = parse_args(argv)
+    files = collection_files(args.paths)
+    if not files: print("No Collection files found."); return 0
+    options = {'workers':args.workers, 'memory':args.memory,
+        'per_worker':args.per_worker}
+    start = time.perf_counter()
+    if args.command == 'convert':
+        failures = run_pool(convert_file, [(f, args.to.lower(),
+            args.remove) for f in files], **options)
+    elif args.command == 'sort':
+        failures = run_pool(sort_file, [(f, args.by, not args.descending)
+            for f in files], **options)
+    elif args.command == 'refresh':
+        # Workers split Scryfall's rate limit (10 requests/second) evenly
+        workers = min(args.workers or os.cpu_count() or 1, len(files))
+        options['workers'] = workers
+        failures = run_pool(refresh_file, [(f, args.max_age*24*3600,
+            not args.no_prices) for f in files], rate=10/workers, **options)
+    elif args.command == 'export':
+        os.makedirs(args.out, exist_ok=True)
+        failures = run_pool(export_file, [(f, args.to.lower(), args.out)
+            for f in files], **options)
+    else: failures = merge_files(files, args.out, **options)
+    print(f"{len(files)-failures} of {len(files)} files done in "
+        f"{time.perf_counter()-start:.1f}s")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:28:20 2026
+
+This module contains the benchmark suite for ScrollRack's performance-
+sensitive code: sorting, adding cards, saving and loading, formatting and
+replaying Scryfall search results, the GUI's table model, and the import
+time of ScrollRack's entry points (against a budget). Benchmarks run
+on synthetic collections (of 1k to 1M rows) and on Scryfall pages that are
+either generated or recorded beforehand with record_pages(), so that they
+need no network access. Each benchmark is timed and its peak memory use
+traced, and the results are saved as json and can be compared against a
+baseline run to catch regressions. Run from the command line, e.g.:
+
+    python Benchmarks.py --sizes 1000,10000 --baseline base.json
+
+@author: Joe Raso
+"""
+
+import os, sys, json, time, random, argparse, platform, tempfile
+import subprocess
+import tracemalloc
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from Search import ScryfallPortal
+from Cache import ResponseCache
+from Collection import Collection
+from Cards import COLOR_ORDER
+
+# Default collection sizes (in rows)
+SIZES = [1000, 10000, 100000, 1000000]
+# Import time budgets (in seconds) of the entry points: scripts working with
+# Collections, the GUI (whose window is shown before Collection is imported)
+# and the batch command line
+STARTUP_BUDGETS = {'Collection':0.8, 'MainGUI':0.4, 'Batch':0.1}
+
+# Synthetic data generators ===================================================
+def synthetic_cards(ncards, seed=0):
+    """Returns a list of (ncards) randomly generated card dictionaries in the
+    format returned by Scryfall's API, with a realistic mix of layouts."""
+    rng = random.Random(seed)
+    layouts = ['normal']*40 + ['transform', 'modal_dfc', 'split',
+        'adventure', 'flip', 'meld', 'reversible_card']
+    sets = ['ala', 'm10', 'znr', 'khm', 'stx', 'afr', 'mid', 'vow', 'neo']
+    rarities = ['common']*6 + ['uncommon']*3 + ['rare', 'mythic']
+    cards = []
+    for i in range(ncards):
+        colors = rng.sample('WUBRG', rng.choice([0, 1, 1, 1, 2, 2, 3]))
+        cost = '{%d}' % rng.randint(0, 6) + ''.join('{%s}' % c
+            for c in colors)
+        card = {'object':'card', 'name':f'Card {i}', 'set':rng.choice(sets),
+            'rarity':rng.choice(rarities), 'cmc':float(rng.randint(0, 9)),
+            'released_at':'2021-09-24', 'layout':rng.choice(layouts),
+            'type_line':'Creature — Elf', 'collector_number':str(i)}
+        if card['layout'] in ('transform', 'modal_dfc', 'reversible_card'):
+            back = rng.sample('WUBRG', 1)
+            card['card_faces'] = [
+                {'name':f'Card {i}', 'mana_cost':cost, 'colors':colors},
+                {'name':f'Back {i}', 'mana_cost':'', 'colors':back}]
+        elif card['layout'] in ('split', 'adventure', 'flip'):
+            card['mana_cost'] = cost + ' // {1}'; card['colors'] = colors
+            card['card_faces'] = [{'name':f'Card {i}', 'mana_cost':cost},
+                {'name':f'Side {i}', 'mana_cost':'{1}'}]
+        else: card['mana_cost'] = cost; card['colors'] = colors
+        cards.append(card)
+    return cards
+@lru_cache(maxsize=4)
+def cached_cards(ncards):
+    """synthetic_cards(), generated once per size."""
+    return synthetic_cards(ncards)
+def synthetic_collection(nrows, seed=0):
+    """Returns a randomly generated Collection of (nrows) cards. The values
+    are generated column by column, so that even the largest collections
+    take only a moment to build. Names repeat, as copies of a card would."""
+    rng = np.random.default_rng(seed)
+    sets = {'ALA':'2008-10-03', 'M10':'2009-07-17', 'ZNR':'2020-09-25',
+        'KHM':'2021-02-05', 'STX':'2021-04-23', 'AFR':'2021-07-23',
+        'MID':'2021-09-24', 'VOW':'2021-11-19', 'NEO':'2022-02-18'}
+    colors = np.array(COLOR_ORDER, dtype=object)[rng.integers(0,
+        len(COLOR_ORDER), nrows)]
+    generic = rng.integers(0, 7, nrows)
+    codes = rng.integers(0, len(sets), nrows)
+    names = 'Card ' + pd.Series(rng.integers(0, max(nrows//2, 1),
+        nrows)).astype(str)
+    # Costs are built once per distinct (generic, colors) pair
+    pairs = pd.Series(generic.astype(str)) + '|' + pd.Series(colors)
+    pairs, uniques = pd.factorize(pairs)
+    costs = np.array(['{%s}' % g + ''.join('{%s}' % c for c in color)
+        for g, color in (u.split('|') for u in uniques)], dtype=object)
+    data = pd.DataFrame({'Name':names,
+        'Cost':costs[pairs],
+        'Set':np.array(list(sets), dtype=object)[codes],
+        'Rarity':rng.choice(['C', 'U', 'R', 'M'], nrows,
+            p=[0.55, 0.3, 0.12, 0.03]),
+        'MV':generic + np.array([len(c) for c in COLOR_ORDER])[
+            pd.Index(COLOR_ORDER).get_indexer(colors)],
+        'Color':colors,
+        'Released':np.array(list(sets.values()), dtype=object)[codes]})
+    collection = Collection(data); collection.name = f"Synthetic {nrows}"
+    return collection
+def synthetic_pages(ncards, query="benchmark", pagesize=175):
+    """Returns the pages of a synthetic Scryfall search for (ncards) cards,
+    as the (uri, params, response) of each request, in the form saved by
+    record_pages()."""
+    searchpath = ScryfallPortal(cache=False).searchpath
+    cards = cached_cards(ncards); pages = []
+    for i, start in enumerate(range(0, ncards, pagesize)):
+        js = {'object':'list', 'total_cards':ncards,
+            'data':cards[start:start+pagesize]}
+        if start + pagesize < ncards:
+            js['has_more'] = True
+            js['next_page'] = f"{searchpath}?q={query}&page={i+2}"
+        if i == 0: pages.append([searchpath, {'q':query}, js])
+        else: pages.append([pages[-1][2]['next_page'], None, js])
+    return {'query':query, 'pages':pages}
+
+# Recorded searches ===========================================================
+def record_pages(query, fpath="Cache/pages.json", maxcards=None):
+    """Runs a Scryfall search and records its raw responses to fpath, so that
+    the search can be replayed offline by the benchmarks (see --pages)."""
+    portal = ScryfallPortal(cache=False); pages = []
+    request = portal.request
+    def recording(uri, method='GET', cached=True, **kwargs):
+        js = request(uri, method, cached, **kwargs)
+        pages.append([uri, kwargs.get('params'), js])
+        return js
+    portal.request = recording
+    ncards = sum(len(page) for page in portal.fetch_pages(query, maxcards))
+    if os.path.dirname(fpath): os.makedirs(os.path.dirname(fpath),
+        exist_ok=True)
+    with open(fpath, 'w', encoding='utf-8') as fobj:
+        json.dump({'query':query, 'pages':pages}, fobj)
+    print(f"Recorded {len(pages)} page(s), {ncards} cards, to {fpath}")
+def replay_portal(recording):
+    """Returns a ScryfallPortal that answers a recorded search from an
+    in-memory cache holding its responses (so replaying it goes through the
+    same code path as a cached search)."""
+    cache = ResponseCache(":memory:", ttl=365*24*3600, maxbytes=2**40)
+    for uri, params, js in recording['pages']: cache.put(uri, js, params)
+    return ScryfallPortal(cache=cache)
+
+# Benchmark registry ==========================================================
+# Each benchmark is a function taking a synthetic Collection, which prepares
+# (untimed) and returns the function to be timed. It is called again for each
+# repeat, so the timed function may work in place.
+BENCHMARKS = {}
+def benchmark(name, maxrows=None, qt=False):
+    """Registers a benchmark function under a name. Benchmarks are skipped
+    for collections larger than maxrows, if given, and those needing the GUI
+    (qt) are skipped if PyQt5 is not installed."""
+    def register(function):
+        BENCHMARKS[name] = {'function':function, 'maxrows':maxrows,
+            'qt':qt}
+        return function
+    return register
+
+@benchmark('sort_by')
+def bench_sort_by(collection):
+    data = Collection(collection)
+    return lambda: data.sort_by(['Color', 'Cost', 'Name'])
+@benchmark('add_cards')
+def bench_add_cards(collection):
+    data = Collection(collection); other = Collection(collection)
+    return lambda: data.add_cards(other)
+@benchmark('add_page')
+def bench_add_page(collection):
+    # Adding a single page of search results to a large collection
+    data = Collection(collection); page = Collection(collection.iloc[:175])
+    return lambda: data.add_cards(page)
+@benchmark('save_csv')
+def bench_save_csv(collection):
+    fpath = os.path.join(tempfile.gettempdir(), "scrollrack_bench.csv")
+    data = Collection(collection)
+    return lambda: data.save(fpath)
+@benchmark('load_csv')
+def bench_load_csv(collection):
+    fpath = os.path.join(tempfile.gettempdir(), "scrollrack_bench.csv")
+    Collection(collection).save(fpath)
+    return lambda: Collection.from_file(fpath)
+@benchmark('save_feather')
+def bench_save_feather(collection):
+    fpath = os.path.join(tempfile.gettempdir(), "scrollrack_bench.feather")
+    data = Collection(collection)
+    return lambda: data.save(fpath)
+@benchmark('load_feather')
+def bench_load_feather(collection):
+    fpath = os.path.join(tempfile.gettempdir(), "scrollrack_bench.feather")
+    Collection(collection).save(fpath)
+    return lambda: Collection.from_file(fpath)
+@benchmark('format_result', maxrows=100000)
+def bench_format_result(collection):
+    portal = ScryfallPortal(cache=False); cards = cached_cards(len(collection))
+    return lambda: portal.format_result(cards)
+@benchmark('search_replay', maxrows=100000)
+def bench_search_replay(collection):
+    recording = synthetic_pages(len(collection))
+    portal = replay_portal(recording)
+    return lambda: portal.search(recording['query'], maxcards=None)
+@benchmark('model_snapshot', qt=True)
+def bench_model_snapshot(collection):
+    from MainGUI import CollectionModel
+    return lambda: CollectionModel(collection)
+@benchmark('model_data', qt=True)
+def bench_model_data(collection):
+    # Reading every cell of the loaded rows, as a repaint would
+    from MainGUI import CollectionModel
+    from PyQt5 import QtCore
+    model = CollectionModel(collection)
+    indexes = [model.index(row, column) for row in range(model.rowCount())
+        for column in range(model.columnCount())]
+    role = QtCore.Qt.DisplayRole
+    def run():
+        for index in indexes: model.data(index, role)
+    return run
+@benchmark('parse_mana_cost', qt=True)
+def bench_parse_mana_cost(collection):
+    # Drawing the costs of the loaded rows, starting from empty image caches
+    from MainGUI import CollectionModel, ManaSymbols
+    model = CollectionModel(collection)
+    ManaSymbols.symbols.clear(); ManaSymbols.costs.clear()
+    indexes = [model.index(row, model.manacolumn) for row in
+        range(model.rowCount())]
+    def run():
+        for index in indexes: model.parseManaCost(index)
+    return run
+
+# Running the suite ===========================================================
+def qt_available():
+    """Starts a headless QApplication for the GUI benchmarks, returning
+    whether PyQt5 is available."""
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5 import QtWidgets
+    except ImportError: return False
+    if QtWidgets.QApplication.instance() is None:
+        qt_available.app = QtWidgets.QApplication([])
+    return True
+def measure(make, collection, repeats=3, memory=True):
+    """Times a benchmark (the best and mean of repeats) and, optionally,
+    traces the peak memory allocated while it runs (in a separate run,
+    since tracing slows it down)."""
+    times = []
+    for _ in range(repeats):
+        run = make(collection)
+        start = time.perf_counter(); run()
+        times.append(time.perf_counter() - start)
+    result = {'seconds':min(times), 'mean_seconds':sum(times)/len(times),
+        'repeats':repeats}
+    if memory:
+        run = make(collection)
+        tracemalloc.start(); run()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+def import_times(module, repeats=3):
+    """Imports a module in fresh interpreters, with -X importtime. Returns
+    the best of its total import times (in seconds) and, for that run, the
+    ten modules that took the longest to import themselves, as (seconds,
+    name) pairs."""
+    best = None
+    for _ in range(repeats):
+        run = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+            f'import {module}'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        if run.returncode != 0:
+            raise ImportError(run.stderr.strip().splitlines()[-1])
+        times = [] # (own time, total time, name)
+        for line in run.stderr.splitlines():
+            if not line.startswith('import time:') or '[us]' in line:
+                continue
+            own, total, name = line[len('import time:'):].split('|')
+            times.append((int(own)/1e6, int(total)/1e6, name.strip()))
+        total = next(t for _, t, name in reversed(times) if name == module)
+        if best is None or total < best[0]:
+            best = (total, sorted(((o, n) for o, _, n in times),
+                reverse=True)[:10])
+    return best
+def run_startup(repeats=3):
+    """Measures the import time of each entry point (see STARTUP_BUDGETS),
+    reporting those over budget along with their slowest imports."""
+    results = {}
+    for module, budget in STARTUP_BUDGETS.items():
+        try: total, slowest = import_times(module, repeats)
+        except ImportError as error:
+            print(f"Skipping import[{module}]: {error}"); continue
+        result = {'seconds':total, 'budget_seconds':budget,
+            'slowest':[[name, own] for own, name in slowest]}
+        results[f"import[{module}]"] = result
+        report(f"import[{module}]", result)
+        if total > budget:
+            print(f"  over budget ({budget*1000:.0f} ms); slowest imports: "
+                + ", ".join(f"{name} {own*1000:.0f} ms" for own, name in
+                slowest[:5]))
+    return results
+def run_suite(sizes=SIZES, names=None, repeats=3, memory=True,
+              recording=None):
+    """Runs the registered benchmarks (or just those named) on synthetic
+    collections of each size, and on a recorded search if one is given,
+    along with the startup benchmarks (named 'startup'). Returns the
+    results, keyed by 'benchmark[size]', along with details of the
+    environment they were run in."""
+    names = names or list(BENCHMARKS) + ['startup']
+    results = {}; qt = None
+    if 'startup' in names: results.update(run_startup(repeats))
+    names = [name for name in names if name != 'startup']
+    for nrows in sizes if names else []:
+        collection = synthetic_collection(nrows)
+        for name in names:
+            spec = BENCHMARKS[name]
+            if spec['maxrows'] and nrows > spec['maxrows']: continue
+            if spec['qt']:
+                if qt is None: qt = qt_available()
+                if not qt: continue
+            try: result = measure(spec['function'], collection, repeats,
+                memory)
+            except ImportError as error:
+                # e.g. the binary formats without pyarrow
+                print(f"Skipping {name}: {error}"); continue
+            results[f"{name}[{nrows}]"] = result
+            report(f"{name}[{nrows}]", result)
+    if recording is not None:
+        portal = replay_portal(recording)
+        result = measure(lambda c: lambda: portal.search(recording['query'],
+            maxcards=None), None, repeats, memory)
+        result['cards'] = sum(len(js.get('data', [])) for _, _, js in
+            recording['pages'])
+        results['search_replay[recorded]'] = result
+        report('search_replay[recorded]', result)
+    return {'meta':environment(), 'results':results}
+def environment():
+    """Returns the details of the environment the benchmarks ran in."""
+    return {'time':time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python':platform.python_version(), 'platform':platform.platform(),
+        'processor':platform.processor(), 'cpus':os.cpu_count(),
+        'pandas':pd.__version__, 'numpy':np.__version__}
+def report(key, result):
+    line = f"{key:<32} {result['seconds']*1000:>10.2f} ms"
+    if 'peak_bytes' in result:
+        line += f" {result['peak_bytes']/2**20:>10.1f} MiB peak"
+    print(line)
+
+# Saving and comparing results ================================================
+def save_results(results, fpath):
+    """Saves benchmark results to a json file."""
+    if os.path.dirname(fpath): os.makedirs(os.path.dirname(fpath),
+        exist_ok=True)
+    with open(fpath, 'w', encoding='utf-8') as fobj:
+        json.dump(results, fobj, indent=1)
+def compare(results, baseline, tolerance=0.2):
+    """Compares results against a baseline run, printing the change of each
+    benchmark present in both. Returns the list of regressions: benchmarks
+    whose time or peak memory grew by more than (tolerance) (e.g. 20%)."""
+    regressions = []
+    old = baseline['results']; new = results['results']
+    print(f"\n{'benchmark':<32} {'time':>10} {'memory':>10}")
+    for key in sorted(set(old) & set(new)):
+        changes = {}
+        for field in ['seconds', 'peak_bytes']:
+            if old[key].get(field) and field in new[key]:
+                changes[field] = new[key][field]/old[key][field]
+        flags = [f for f, ratio in changes.items() if ratio > 1+tolerance]
+        if flags: regressions.append({'benchmark':key, 'measures':flags,
+            'ratios':changes})
+        print(f"{key:<32} " + " ".join(f"{changes[f]:>9.2f}x"
+            if f in changes else f"{'-':>10}" for f in
+            ['seconds', 'peak_bytes']) + ("  REGRESSION" if flags else ""))
+    return regressions
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Runs ScrollRack's "
+        "benchmark suite.")
+    parser.add_argument('--sizes', default=",".join(map(str, SIZES)),
+        help="comma separated collection sizes (rows)")
+    parser.add_argument('--only', help="comma separated benchmark names "
+        f"(of: {', '.join(BENCHMARKS)}, startup)")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true',
+        help="skip tracing peak memory")
+    parser.add_argument('--pages', default="Cache/pages.json",
+        help="recorded search to replay (see --record)")
+    parser.add_argument('--record', metavar='QUERY',
+        help="record a Scryfall search to --pages, then exit")
+    parser.add_argument('--out', default="Cache/benchmarks.json",
+        help="where to save the results (json)")
+    parser.add_argument('--baseline', help="results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+    if args.record:
+        record_pages(args.record, args.pages); sys.exit()
+    recording = None
+    if os.path.exists(args.pages):
+        with open(args.pages, 'r', encoding='utf-8') as fobj:
+            recording = json.load(fobj)
+    results = run_suite([int(s) for s in args.sizes.split(",")],
+        args.only.split(",") if args.only else None, args.repeats,
+        not args.no_memory, recording)
+    save_results(results, args.out)
+    print(f"Results saved to {args.out}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as fobj:
+            baseline = json.load(fobj)
+        if compare(results, baseline, args.tolerance): sys.exit(1)
+    # Entry points over their import time budget also fail the run
+    if any(r['seconds'] > r['budget_seconds'] for r in
+            results['results'].values() if 'budget_seconds' in r):
+        sys.exit(1)
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:27:05 2026
+
+This module contains the CardDatabase object, an offline copy of Scryfall's
+card database built from one of their bulk data files (see
+https://scryfall.com/docs/api/bulk-data), along with a local evaluator for a
+subset of Scryfall's search syntax so that Collections can be generated from
+searches without going through the API.
+
+@author: Joe Raso
+"""
+
+import re, json
+import numpy as np
+import pandas as pd
+
+def iter_json_array(fobj, blocksize=2**20):
+    """Yields the objects of a (potentially very large) json array one at a
+    time, reading the file in blocks so that it is never held in memory all
+    at once. Raises a ValueError if the array is truncated or holds
+    something that isn't json (each object must be smaller than a block)."""
+    decoder = json.JSONDecoder(); buffer = ''; started = False
+    for block in iter(lambda: fobj.read(blocksize), ''):
+        buffer += block; pos = 0
+        while True:
+            # Skip whitespace and the separators between objects
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,': pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != '[':
+                    raise ValueError("Bulk data file is not a json array.")
+                started = True; pos += 1; continue
+            if pos >= len(buffer) or buffer[pos] == ']': break
+            try: obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as error:
+                # The object may continue in the next block - unless a whole
+                # block has already been read past its start
+                if len(buffer) - pos > blocksize:
+                    raise ValueError(f"Bulk data file is corrupt: {error}")
+                break
+            yield obj
+        buffer = buffer[pos:]
+    if not buffer.startswith(']'):
+        raise ValueError("Bulk data file is truncated or corrupt (at: "
+            f"{buffer[:40]!r}).")
+
+class CardDatabase:
+    """An offline, searchable table of every card in a Scryfall bulk data
+    file. The table holds the Collection columns along with a few columns
+    (lowercase name, type line, color bitmask and rarity rank) that are
+    precomputed for the query evaluator."""
+    # Keywords recognized by the query evaluator, mapped to their handlers
+    keywords = {'name':'name', 'n':'name', 'e':'set', 's':'set',
+        'set':'set', 'edition':'set', 'c':'color', 'color':'color',
+        'colors':'color', 'r':'rarity', 'rarity':'rarity', 'cmc':'mv',
+        'mv':'mv', 'manavalue':'mv', 't':'type', 'type':'type'}
+    colorbits = {'W':1, 'U':2, 'B':4, 'R':8, 'G':16}
+    colornames = {'white':'W', 'blue':'U', 'black':'B', 'red':'R',
+        'green':'G'}
+    rarityranks = {'C':0, 'U':1, 'R':2, 'S':3, 'special':3, 'M':4,
+        'B':5, 'bonus':5}
+    def __init__(self, cards, fpath=None):
+        self.cards = cards; self.fpath = fpath
+        self.build_indexes()
+    def __len__(self):
+        return len(self.cards)
+
+    # Construction ============================================================
+    @classmethod
+    def ingest(cls, dumppath, fpath="Cache/cards.pkl", chunksize=10000):
+        """Builds a database from a Scryfall bulk data file (a json array of
+        card objects), streaming through it in chunks of cards. If fpath is
+        given, the database is also saved there for later use with load()."""
+        # (Only needed to format the cards - not to load a saved database)
+        from Search import ScryfallPortal
+        portal = ScryfallPortal(cache=False); chunks = []
+        with open(dumppath, 'r', encoding='utf-8') as fobj:
+            chunk = []
+            for card in iter_json_array(fobj):
+                chunk.append(card)
+                if len(chunk) >= chunksize:
+                    chunks.append(cls.format_chunk(portal, chunk)); chunk = []
+            if chunk: chunks.append(cls.format_chunk(portal, chunk))
+        if chunks: cards = pd.concat(chunks, ignore_index=True)
+        else: cards = cls.format_chunk(portal, [])
+        database = cls(cards, fpath=fpath)
+        if fpath: database.save()
+        return database
+    @classmethod
+    def format_chunk(cls, portal, chunk):
+        """Formats a list of raw card objects into database rows."""
+        if chunk: data = portal.format_result(chunk)
+        else: data = pd.DataFrame(columns=['Name', 'Cost', 'Set', 'Rarity',
+            'MV', 'Color', 'Released'])
+        data.reset_index(drop=True, inplace=True)
+        # Precomputed search columns
+        data['name_lc'] = data['Name'].str.lower()
+        data['type_lc'] = [c.get('type_line', '').lower() for c in chunk]
+        data['colormask'] = np.array([sum(cls.colorbits[c] for c in colors)
+            for colors in data['Color']], dtype=np.int8)
+        data['rarityrank'] = data['Rarity'].map(cls.rarityranks).fillna(
+            -1).astype(np.int8)
+        return data
+    def build_indexes(self):
+        """Builds the lookup tables from set codes and rarities to the rows
+        that hold them."""
+        self.indexes = {}
+        for column in ['Set', 'Rarity']:
+            codes, uniques = pd.factorize(self.cards[column])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques)+1))
+            self.indexes[column] = {value:order[bounds[i]:bounds[i+1]]
+                for i, value in enumerate(uniques)}
+
+    # Save/load functionality =================================================
+    def save(self, fpath=None):
+        """Saves the database to the given location (or its own fpath)."""
+        if fpath: self.fpath = fpath
+        self.cards.to_pickle(self.fpath)
+    @classmethod
+    def load(cls, fpath="Cache/cards.pkl"):
+        """Loads a database previously built with ingest()."""
+        return cls(pd.read_pickle(fpath), fpath=fpath)
+
+    # Searching ===============================================================
+    def search(self, query):
+        """Returns the cards matching a Scryfall-style query as a Collection-
+        compatible DataFrame. Supports bare and quoted name words, !"exact
+        names", name:, e:/set:, c:/color:, r:/rarity:, cmc:/mv: (with the
+        comparison operators : = != < <= > >=), t:/type:, negation with '-',
+        'or' and parentheses."""
+        mask = self.evaluate(query)
+        columns = ['Name', 'Cost', 'Set', 'Rarity', 'MV', 'Color', 'Released']
+        return self.cards.loc[mask, columns].reset_index(drop=True)
+    def evaluate(self, query):
+        """Returns a boolean mask over the database for the given query."""
+        tokens = re.findall(r'-?\(|\)|-?!?[A-Za-z]+(?:>=|<=|!=|:|=|>|<)'
+            r'(?:"[^"]*"|[^\s()]+)|-?!?"[^"]*"|-?!?[^\s()]+', query)
+        if not tokens: return np.zeros(len(self), dtype=bool)
+        mask, pos = self.parse_or(tokens, 0)
+        if pos != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[pos]}' in query.")
+        return mask
+    def parse_or(self, tokens, pos):
+        # An 'or' expression is a series of 'and' expressions
+        mask, pos = self.parse_and(tokens, pos)
+        while pos < len(tokens) and tokens[pos].lower() == 'or':
+            other, pos = self.parse_and(tokens, pos+1)
+            mask = mask | other
+        return mask, pos
+    def parse_and(self, tokens, pos):
+        # An 'and' expression is a series of (implicitly and-ed) terms
+        mask = np.ones(len(self), dtype=bool); empty = True
+        while pos < len(tokens) and tokens[pos] != ')' and \
+                tokens[pos].lower() not in ('or', 'and'):
+            if tokens[pos] in ('(', '-('):
+                negate = tokens[pos] == '-('
+                term, pos = self.parse_or(tokens, pos+1)
+                if pos >= len(tokens) or tokens[pos] != ')':
+                    raise ValueError("Unbalanced parentheses in query.")
+                pos += 1
+                if negate: term = ~term
+            else:
+                term = self.evaluate_term(tokens[pos]); pos += 1
+            mask = mask & term; empty = False
+            # Explicit 'and' is allowed between terms
+            if pos < len(tokens) and tokens[pos].lower() == 'and': pos += 1
+        if empty: raise ValueError("Empty expression in query.")
+        return mask, pos
+    def evaluate_term(self, token):
+        """Returns the boolean mask for a single search term."""
+        negate = token.startswith('-'); token = token.lstrip('-')
+        match = re.fullmatch(r'([A-Za-z]+)(>=|<=|!=|:|=|>|<)(.+)', token)
+        if match and not token.startswith('!'):
+            keyword, op, value = match.groups()
+            value = value.strip('"')
+            if keyword.lower() not in self.keywords:
+                raise ValueError(f"Unsupported query keyword '{keyword}'.")
+            handler = getattr(self, 'match_'+self.keywords[keyword.lower()])
+            mask = handler(op, value)
+        elif token.startswith('!'): # exact name match
+            mask = (self.cards['name_lc'] == token[1:].strip('"').lower())
+        else: mask = self.match_name(':', token.strip('"'))
+        mask = np.asarray(mask, dtype=bool)
+        return ~mask if negate else mask
+
+    # Term handlers ===========================================================
+    @staticmethod
+    def compare(values, op, target):
+        """Applies a comparison operator between an array and a value."""
+        if op in (':', '='): return values == target
+        elif op == '!=': return values != target
+        elif op == '<': return values < target
+        elif op == '<=': return values <= target
+        elif op == '>': return values > target
+        elif op == '>=': return values >= target
+    def match_name(self, op, value):
+        if op == '!=':
+            return ~self.cards['name_lc'].str.contains(value.lower(),
+                regex=False).to_numpy()
+        return self.cards['name_lc'].str.contains(value.lower(),
+            regex=False).to_numpy()
+    def match_type(self, op, value):
+        mask = self.cards['type_lc'].str.contains(value.lower(),
+            regex=False).to_numpy()
+        return ~mask if op == '!=' else mask
+    def match_set(self, op, value):
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.indexes['Set'].get(value.upper(), [])] = True
+        return ~mask if op == '!=' else mask
+    def match_mv(self, op, value):
+        try: target = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid mana value '{value}' in query.")
+        return self.compare(self.cards['MV'].to_numpy(), op, target)
+    def match_rarity(self, op, value):
+        value = value.lower()
+        code = {'common':'C', 'uncommon':'U', 'rare':'R', 'mythic':'M',
+            'special':'S', 'bonus':'B'}.get(value, value.upper())
+        if code not in self.rarityranks:
+            raise ValueError(f"Unknown rarity '{value}' in query.")
+        if op in (':', '=', '!='): # use the index for equality
+            mask = np.zeros(len(self), dtype=bool)
+            for rarity in self.indexes['Rarity']:
+                if self.rarityranks.get(rarity) == self.rarityranks[code]:
+                    mask[self.indexes['Rarity'][rarity]] = True
+            return ~mask if op == '!=' else mask
+        return self.compare(self.cards['rarityrank'].to_numpy(), op,
+            self.rarityranks[code])
+    def match_color(self, op, value):
+        colors = self.cards['colormask'].to_numpy()
+        value = value.lower()
+        # Special values for multicolored and colorless cards
+        if value in ('m', 'multicolor'):
+            counts = np.zeros(len(self), dtype=np.int8)
+            for bit in self.colorbits.values(): counts += (colors & bit) > 0
+            mask = counts >= 2
+            return ~mask if op == '!=' else mask
+        if value in ('c', 'colorless'): target = 0
+        else:
+            value = self.colornames.get(value, value.upper())
+            if any(c not in self.colorbits for c in value):
+                raise ValueError(f"Unknown color '{value}' in query.")
+            target = sum(self.colorbits[c] for c in set(value))
+        if target == 0 and op == ':': op = '='
+        # Color comparisons are set comparisons (':' means 'at least')
+        superset = (colors & target) == target
+        subset = (colors & ~target) == 0
+        if op in (':', '>='): return superset
+        elif op == '=': return superset & subset
+        elif op == '!=': return ~(superset & subset)
+        elif op == '>': return superset & (colors != target)
+        elif op == '<=': return subset
+        elif op == '<': return subset & (colors != target)
+
+if __name__ == '__main__':
+
+    database = CardDatabase.ingest("Cache/default-cards.json")
+    test = database.search('e:ala c:g t:creature mv<=3')
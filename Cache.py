@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:26:01 2026
+
+This module contains the ResponseCache object used by the ScryfallPortal to
+store API responses on disk, so that repeated or overlapping searches do not
+need to go back out to Scryfall.
+
+@author: Joe Raso
+"""
+
+import os, json, time, zlib, hashlib, sqlite3, threading
+
+class ResponseCache:
+    """A persistent, content-addressed store of Scryfall API responses, kept
+    as compressed json in a single SQLite file. Entries expire after a
+    time-to-live (ttl, in seconds), and the least recently used entries are
+    evicted once the total stored size exceeds maxbytes."""
+    def __init__(self, fpath="Cache/responses.sqlite", ttl=24*3600,
+                 maxbytes=64*2**20):
+        self.fpath = fpath; self.ttl = ttl; self.maxbytes = maxbytes
+        # Hit/miss counters (for the lifetime of this object only)
+        self.hits = 0; self.misses = 0
+        # Make sure the containing directory exists (unless held in memory)
+        if fpath != ":memory:" and os.path.dirname(fpath):
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        # One connection is shared between threads, guarded by a lock
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(fpath, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, body BLOB, size INTEGER, "
+            "expires REAL, accessed REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS lru ON "
+            "responses (accessed)")
+        self.db.commit()
+
+    # Keying ==================================================================
+    @staticmethod
+    def make_key(uri, params=None):
+        """Returns the cache key for a request - a hash of the uri and its
+        (sorted) query parameters."""
+        text = uri + json.dumps(params or {}, sort_keys=True)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    # Cache access ============================================================
+    def get(self, uri, params=None):
+        """Returns the cached response (as a dictionary) for the given request,
+        or None if there is no unexpired entry for it."""
+        key = self.make_key(uri, params); now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT body, expires FROM responses "
+                "WHERE key=?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            # Mark the entry as recently used for the LRU eviction
+            self.db.execute("UPDATE responses SET accessed=? WHERE key=?",
+                (now, key))
+            self.db.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+    def put(self, uri, response, params=None, ttl=None):
+        """Stores a response (dictionary) for the given request, evicting old
+        entries if the cache has grown past its size limit."""
+        key = self.make_key(uri, params); now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        body = zlib.compress(json.dumps(response).encode('utf-8'))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES "
+                "(?, ?, ?, ?, ?)", (key, body, len(body), now+ttl, now))
+            self.evict()
+            self.db.commit()
+    def evict(self):
+        """Removes expired entries, then the least recently used ones until
+        the cache fits within maxbytes. (Caller must hold the lock.)"""
+        self.db.execute("DELETE FROM responses WHERE expires<?",
+            (time.time(),))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM "
+            "responses").fetchone()[0]
+        if total <= self.maxbytes: return
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY "
+            "accessed").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.maxbytes: break
+            stale.append((key,)); total -= size
+        self.db.executemany("DELETE FROM responses WHERE key=?", stale)
+    def clear(self):
+        """Empties the cache and resets the hit/miss counters."""
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+        self.hits = 0; self.misses = 0
+
+    # Reporting ===============================================================
+    def stats(self):
+        """Returns a dictionary of the cache's hit/miss counts, hit rate,
+        number of entries and stored size (in bytes)."""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), "
+                "COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {'hits':self.hits, 'misses':self.misses,
+            'hit_rate':(self.hits/lookups if lookups else 0.0),
+            'entries':entries, 'bytes':size}
+
+if __name__ == '__main__':
+
+    cache = ResponseCache(":memory:", maxbytes=2000)
+    cache.put('https://api.scryfall.com/cards/search', {'data':[1,2,3]},
+        params={'q':'e:ala'})
+    print(cache.get('https://api.scryfall.com/cards/search',
+        params={'q':'e:ala'}))
+    print(cache.stats())
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:28:20 2026
+
+This module holds the card-level constants shared between ScrollRack's
+modules --- rarity codes, the canonical ordering of colors, and lookups for
+turning Scryfall's color lists into ScrollRack's color strings.
+
+@author: Joe Raso
+"""
+
+from itertools import permutations
+
+# Scryfall's rarity names mapped to ScrollRack's one-letter codes
+RARITY_CODES = {'mythic':'M', 'rare':'R', 'uncommon':'U', 'common':'C'}
+# Rarities in increasing order (for sorting)
+RARITY_ORDER = ['C', 'U', 'R', 'M']
+
+# The five colors, in the conventional (color pie) order
+COLORS = 'WUBRG'
+# Every color combination, in the order used for sorting: colorless, mono-,
+# then two-, three-, four- and five-colored (each in color pie order).
+COLOR_ORDER = ['', 'W', 'U', 'B', 'R', 'G', 'WU', 'WB', 'UB', 'UR', 'BR',
+    'BG', 'RG', 'WR', 'WG', 'UG', 'WUB', 'WUR', 'UBR', 'UBG', 'BRG', 'WBR',
+    'WRG', 'URG', 'WUG', 'WBG', 'WUBR', 'UBRG', 'WBRG', 'WURG', 'WUBG',
+    'WUBRG']
+
+# Lookup from any ordering of a color combination (e.g. 'GU' or 'UG') to its
+# canonical color string ('UG'), precomputed for all 326 orderings.
+CANONICAL_COLORS = {"".join(p):c for c in COLOR_ORDER
+    for p in permutations(c)}
+
+def canonical_colors(colors):
+    """Returns the canonical color string for a list or string of color
+    letters. Letters outside of WUBRG are kept, after the known colors."""
+    joined = "".join(colors)
+    try: return CANONICAL_COLORS[joined]
+    except KeyError:
+        return "".join(sorted(set(joined), key=lambda c: (COLORS.find(c)
+            if c in COLORS else len(COLORS), c)))
@@ -9,105 +9,751 @@ manipulating lists of M:tG cards.
 @author: Joe Raso
 """
 
+import os, json
+import numpy as np
 import pandas as pd
-from Search import ScryfallPortal
+from Cards import RARITY_ORDER, COLOR_ORDER, canonical_colors
+from Journal import Journal
+from Filter import FilterIndex
+from Analytics import Analytics
+from Formats import read_list, read_export, write_dec, write_list
+from Metrics import timed
 
 # See https://pandas.pydata.org/docs/reference/frame.html
 class Collection(pd.DataFrame):
     """The core object of ScrollRack - a collection is a named list of cards,
     that may represent a deck, the contents of a binder or box, etc."""
+    # The currently in-use card properties, and the types they are stored as
+    # (see conform() below for how each is enforced).
+    schema = {'Sel':'bool', 'Name':'object', 'Cost':'category',
+        'Set':'category', 'Rarity':'category', 'MV':'int16',
+        'Color':'category', 'Released':'datetime64[ns]'}
+    # Optional columns, kept only if present in the data. A 'Qty' column
+    # marks an aggregated Collection, holding one row per distinct printing
+    # along with the number of copies (see collapse() and expand()). 'Price'
+    # (in USD) and 'Refreshed' (the time the card data was last updated)
+    # are added by refresh().
+    optional = {'Qty':'int32', 'Price':'float64',
+        'Refreshed':'datetime64[ns]'}
+    # The card properties that identify a printing
+    keycolumns = ['Name', 'Cost', 'Set', 'Rarity', 'MV', 'Color', 'Released']
+    # The change log of a journaled Collection (see enable_journal())
+    journal = None
+    # Counts the changes made through the Collection's own methods, so that
+    # data derived from the cards can be cached until the next change (see
+    # key_counts()). Edits made directly through pandas aren't counted, so
+    # call changed() after making one.
+    version = 0
+    keycache = None
+    filterindex = None
+    analyticscache = None
     def __init__(self, *args, fpath=None, **kwargs):
         # Fix columns to the currently in-use card properties
-        kwargs['columns'] = ['Sel', 'Name', 'Cost', 'Set', 'Rarity', 'MV',
-            'Color', 'Released']
-        super().__init__(*args, **kwargs)
+        data = pd.DataFrame(*args, **kwargs)
+        data = data.reindex(columns=list(self.schema.keys()) +
+            [c for c in self.optional if c in data.columns])
+        # set column indicating selection status to False
+        data['Sel'] = False
+        # Enforce the compact column types of the schema
+        super().__init__(self.conform(data))
+        # (Re-initializing, e.g. on reload(), outdates anything cached)
+        self.changed()
         self.fpath = fpath
         # Needs a name member for certain operations, based on the file path,
         # if one is provided.
         if self.fpath:
             self.name = (self.fpath.split("/")[-1]).split(".")[0]
         else: self.name = "Unnamed"
-        # set column indicating selection status to False
-        self.Sel = False
-        # set any blank values to an empty string
-        self.fillna("", inplace=True)
+
+    # Schema enforcement ======================================================
+    @classmethod
+    def conform(cls, data):
+        """Returns a copy of a DataFrame with the Collection columns converted
+        to the types of the schema. Blank text values are set to an empty
+        string, blank mana values to 0 and unreadable dates to NaT."""
+        columns = list(cls.schema) + [c for c in cls.optional
+            if c in data.columns]
+        data = pd.DataFrame({column:data[column] for column in columns},
+            index=data.index)
+        data['Sel'] = data['Sel'].fillna(False).astype(bool)
+        data['Name'] = data['Name'].fillna("").astype(object)
+        for column in ['Cost', 'Set']:
+            data[column] = cls.categorize(data[column])
+        # Rarities and colors have a fixed (sorting) order of categories
+        data['Rarity'] = cls.categorize(data['Rarity'], RARITY_ORDER)
+        data['Color'] = cls.categorize(data['Color'], COLOR_ORDER,
+            canonical_colors)
+        data['MV'] = pd.to_numeric(data['MV'], errors='coerce').fillna(
+            0).astype('int16')
+        if not pd.api.types.is_datetime64_any_dtype(data['Released']):
+            data['Released'] = pd.to_datetime(data['Released'],
+                errors='coerce')
+        data['Released'] = data['Released'].astype('datetime64[ns]')
+        # Cards without a quantity are single copies
+        if 'Qty' in data.columns:
+            data['Qty'] = pd.to_numeric(data['Qty'], errors='coerce').fillna(
+                1).astype('int32')
+        if 'Price' in data.columns:
+            data['Price'] = pd.to_numeric(data['Price'], errors='coerce')
+        if 'Refreshed' in data.columns:
+            data['Refreshed'] = pd.to_datetime(data['Refreshed'],
+                errors='coerce').astype('datetime64[ns]')
+        return data
+    @staticmethod
+    def categorize(column, order=None, clean=None):
+        """Converts a column to a categorical one. The categories are given
+        by (order) if provided, followed by any other values present (in
+        sorted order), which may first be passed through a (clean) function.
+        Columns that are already categorical are converted through their
+        categories, without touching each value."""
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.fillna("").astype(str).astype('category')
+        elif column.isna().any():
+            if "" not in column.cat.categories:
+                column = column.cat.add_categories([""])
+            column = column.fillna("")
+        values = [str(c) for c in column.cat.categories]
+        if clean is not None: values = [clean(v) for v in values]
+        if order is None: categories = sorted(set(values))
+        else: categories = list(order) + sorted(set(values) - set(order))
+        # Recode from the old categories to the new ones
+        position = {c:i for i, c in enumerate(categories)}
+        lookup = np.array([position[v] for v in values], dtype=np.int32)
+        codes = lookup[column.cat.codes.to_numpy()] if len(lookup) else \
+            np.zeros(len(column), dtype=np.int32)
+        return pd.Categorical.from_codes(codes, categories=categories)
+    def memory_report(self):
+        """Returns the memory used by each column of the Collection (in bytes,
+        including the contents of text values) along with the total."""
+        usage = self.memory_usage(index=True, deep=True)
+        usage['Total'] = usage.sum()
+        return usage
         
     # Editing Functionality ===================================================
-    def copy_selected(self):
-        """Returns a Collection containing a copy of the cards selected."""
+    def copy_selected(self, count=None):
+        """Returns a Collection containing a copy of the cards selected. For
+        an aggregated Collection, at most (count) copies of each selected
+        printing are copied, if given."""
         data = self[self["Sel"]==True].copy()
+        if count is not None and self.aggregated:
+            data['Qty'] = np.minimum(data['Qty'], count)
         return Collection(data) # re-initialize as a collection
-    def drop_selected(self):
-        """Drops the selected cards from the Collection in place."""
-        self.drop(self.index[self["Sel"]==True], inplace=True)
-    def add_cards(self, collection):
-        """Adds the cards from another Collection to this one."""
-        combined = pd.concat([self, collection], axis=0).reset_index()
-        self.__init__(combined, fpath=self.fpath)
-    def sort_by(self, column, ascending=True):
-        """Sorts the Collection in place by the (single) specified card
-        property."""
-        def sort_key(column):
-            rarity_codes = {"C":0, "U":1, "R":2, "M":3}
-            color_codes = {'':0, 'W':0.01, 'U':0.02, 'B':0.03, 'R':0.04,
-                    'G':0.05, 'WU':0.10, 'WB':0.11, 'UB':0.12, 'UR':0.13,
-                    'BR':0.14, 'BG':0.15, 'RG':0.16, 'WR':0.17, 'WG':0.18,
-                    'UG':0.19, 'WUB':0.20, 'WUR':0.21, 'UBR':0.22, 'UBG':0.23,
-                    'BRG':0.24, 'WBR':0.25, 'WRG':0.26, 'URG':0.27, 'WUG':0.28,
-                    'WBG':0.29, 'WUBR':0.30, 'UBRG':0.31, 'WBRG':0.32,
-                    'WURG':0.33, 'WUBG':0.34, 'WUBRG':0.40}
-            # Sorting by set = sorting by release date
-            if column.name == "Set": return self["Released"]
-            # Sorting by color/rarity requires a keying to a numeric value
-            elif column.name == "Rarity": return column.map(rarity_codes)
-            elif column.name == "Color": return column.map(color_codes)
-            # Sorting by cost is a combination of MV/Color
-            elif column.name == "Cost":
-                return self["MV"] + self["Color"].map(color_codes)
-            # Default to normal sorting for undefined columns
-            else: return column
-        self.sort_values([column], ascending=ascending, inplace=True,
-                         key=sort_key)
+    @timed('collection.drop_selected')
+    def drop_selected(self, count=None):
+        """Drops the selected cards from the Collection in place. For an
+        aggregated Collection, (count) copies of each selected printing are
+        removed if given, dropping only the rows that run out of copies.
+        Returns the (former) row positions of the dropped rows."""
+        selected = self["Sel"].to_numpy(dtype=bool)
+        if selected.any():
+            self.record('drop', rows=np.flatnonzero(selected).tolist(),
+                count=count)
+        # Up to date analytics just have the dropped copies taken out
+        analytics = self.tracked_analytics()
+        if analytics is not None and selected.any():
+            removed = Analytics.weights(self)[selected]
+            if count is not None and self.aggregated:
+                removed = np.minimum(removed, count)
+            analytics.add(self[selected], -removed)
+        if count is not None and self.aggregated:
+            qty = self['Qty'].to_numpy(copy=True)
+            qty[selected] = np.maximum(qty[selected] - count, 0)
+            self['Qty'] = qty; self.changed()
+            selected = qty == 0
+        dropped = np.flatnonzero(selected)
+        if len(dropped):
+            self.replace_data(self[~selected].reset_index(drop=True))
+        if analytics is not None: analytics.stamp(self)
+        return dropped
+    @timed('collection.add_cards')
+    def add_cards(self, *collections):
+        """Adds the cards from one or more other Collections to the end of
+        this one, in a single merge. Only the new cards are converted to the
+        schema (and unselected); the cards already here keep their selection
+        status. Returns the (first, last) row positions of the added cards
+        (last < first if nothing was added). For an aggregated Collection,
+        cards already present only have their quantities increased, and just
+        the new printings are added as rows."""
+        first = len(self)
+        new = [self.conform(c) for c in collections if len(c)]
+        if not new: return (first, first-1)
+        for frame in new: frame['Sel'] = False
+        if self.journal is not None:
+            self.record('add', cards=[self.to_record(frame) for frame in new])
+        # Up to date analytics just have the new cards added in
+        analytics = self.tracked_analytics()
+        if self.aggregated:
+            if analytics is not None: before = self['Qty'].to_numpy(copy=True)
+            new = [self.merge_quantities(new)]
+            if analytics is not None:
+                # Copies of printings already here count with their rows
+                qty = self['Qty'].to_numpy()
+                grown = np.flatnonzero(qty != before)
+                analytics.add(self.iloc[grown], qty[grown] - before[grown])
+        elif any('Qty' in frame.columns for frame in new):
+            # Aggregated cards added to a plain Collection are expanded
+            new = [Collection(frame).expand() for frame in new]
+        new = [frame for frame in new if len(frame)]
+        if analytics is not None:
+            for frame in new: analytics.add(frame)
+        if new:
+            # Categories must match for the concatenation to stay categorical
+            parts = self.merge_categories([self] + new)
+            self.replace_data(pd.concat(parts, ignore_index=True))
+        if analytics is not None: analytics.stamp(self)
+        return (first, len(self)-1)
+    def merge_quantities(self, frames):
+        """Adds the quantities of the cards in (frames) to the matching rows
+        of this (aggregated) Collection, and returns the cards with no match
+        as a single aggregated frame."""
+        parts = self.merge_categories(frames)
+        incoming = Collection(pd.concat(parts, ignore_index=True)).collapse()
+        position = pd.Index(self.card_keys()).get_indexer(
+            incoming.card_keys())
+        matched = position >= 0
+        if matched.any():
+            qty = self['Qty'].to_numpy(copy=True)
+            np.add.at(qty, position[matched],
+                incoming['Qty'].to_numpy()[matched])
+            self['Qty'] = qty; self.changed()
+        return pd.DataFrame(incoming[~matched])
+    
+    # Quantities ==============================================================
+    @property
+    def aggregated(self):
+        """Whether the Collection holds one row per printing, with a
+        quantity ('Qty') column."""
+        return 'Qty' in self.columns
+    def card_count(self):
+        """Returns the total number of cards (copies) in the Collection."""
+        return int(self['Qty'].sum()) if self.aggregated else len(self)
+    def card_keys(self):
+        """Returns a (uint64) hash of the card properties identifying the
+        printing of each row."""
+        return pd.util.hash_pandas_object(self[self.keycolumns],
+            index=False).to_numpy()
+    def collapse(self):
+        """Returns an aggregated copy of the Collection, with one row per
+        printing (in order of first appearance) and the number of copies in
+        the 'Qty' column."""
+        qty = self['Qty'].to_numpy() if self.aggregated else \
+            np.ones(len(self), dtype=np.int32)
+        codes, uniques = pd.factorize(self.card_keys())
+        first = np.full(len(uniques), len(self), dtype=np.int64)
+        np.minimum.at(first, codes, np.arange(len(self)))
+        data = pd.DataFrame(self.iloc[first]).reset_index(drop=True)
+        data['Qty'] = np.bincount(codes, weights=qty,
+            minlength=len(uniques)).astype(np.int32)
+        data['Sel'] = False
+        collapsed = Collection(data); collapsed.name = self.name
+        return collapsed
+    def expand(self):
+        """Returns a Collection with one row per copy (the inverse of
+        collapse()), with copies of a printing in consecutive rows."""
+        if not self.aggregated: return Collection(self.copy())
+        rows = np.repeat(np.arange(len(self)), self['Qty'].to_numpy())
+        data = pd.DataFrame(self.iloc[rows]).drop(columns=['Qty'])
+        expanded = Collection(data.reset_index(drop=True))
+        expanded.name = self.name
+        return expanded
+    def merge_categories(self, frames):
+        """Returns the given frames with the categories of each categorical
+        column unified (keeping the order of the first frame's categories)."""
+        frames = list(frames)
+        for column, dtype in self.schema.items():
+            if dtype != 'category': continue
+            categories = frames[0][column].cat.categories
+            for frame in frames[1:]:
+                extra = frame[column].cat.categories.difference(categories,
+                    sort=False)
+                if len(extra): categories = categories.append(extra)
+            for i, frame in enumerate(frames):
+                if not frame[column].cat.categories.equals(categories):
+                    if i == 0: frame = frame.copy(deep=False)
+                    frame[column] = frame[column].cat.set_categories(
+                        categories)
+                    frames[i] = frame
+        return frames
+    def replace_data(self, data):
+        """Replaces the contents of the Collection in place (keeping its name
+        and file path) with a DataFrame that already follows the schema."""
+        pd.DataFrame.__init__(self, data)
+        self.changed()
+    def changed(self):
+        """Marks the Collection's cards as changed (see version)."""
+        self.version += 1
+    @timed('collection.sort_by')
+    def sort_by(self, columns, ascending=True):
+        """Sorts the Collection in place by the specified card property, or
+        by a list of them (e.g. ['Color', 'MV', 'Name']), with ascending
+        given once or per property. The sort is stable, so cards that tie
+        keep their current order."""
+        if isinstance(columns, str): columns = [columns]
+        # (Sorting leaves the analytics as they are)
+        analytics = self.tracked_analytics()
+        self.record('sort', columns=list(columns), ascending=ascending
+            if isinstance(ascending, bool) else list(ascending))
+        self.sort_values(list(columns), ascending=ascending, inplace=True,
+            kind='stable', key=self.sort_key)
         self.reset_index(drop=True, inplace=True)
+        self.changed()
+        if analytics is not None: analytics.stamp(self)
+    def sort_key(self, column):
+        """Returns the values used to sort by a given column. Rarity and
+        color are stored as categoricals whose categories are already in
+        sorting order, so their codes serve as precomputed ordinal keys."""
+        # Sorting by set = sorting by release date
+        if column.name == "Set": return self["Released"]
+        # Sorting by color/rarity is by the (ordered) category codes
+        elif column.name in ("Rarity", "Color"): return column.cat.codes
+        # Sorting by cost is a combination of MV/Color
+        elif column.name == "Cost":
+            ncolors = len(self["Color"].cat.categories)
+            return self["MV"].astype('int32')*ncolors + \
+                self["Color"].cat.codes
+        # Default to normal sorting for undefined columns
+        else: return column
         
+    # Set operations ==========================================================
+    # Comparisons between Collections are made per printing (see card_keys())
+    # and respect quantities, whether either Collection is aggregated or not.
+    # Each returns a new Collection, aggregated if this one is.
+    def key_counts(self):
+        """Returns the distinct card keys of the Collection (as an Index),
+        the number of copies of each, and the row of each key's first copy.
+        These are cached until the Collection is next changed."""
+        if self.keycache is not None and \
+                self.keycache[0] == (self.version, len(self)):
+            return self.keycache[1]
+        qty = self['Qty'].to_numpy() if self.aggregated else \
+            np.ones(len(self), dtype=np.int32)
+        codes, uniques = pd.factorize(self.card_keys())
+        counts = np.bincount(codes, weights=qty,
+            minlength=len(uniques)).astype(np.int64)
+        # Codes are numbered in order of first appearance
+        first = np.flatnonzero(~pd.Index(codes).duplicated())
+        self.keycache = ((self.version, len(self)),
+            (pd.Index(uniques), counts, first))
+        return self.keycache[1]
+    def counts_in(self, other):
+        """Returns the number of copies, in another Collection, of each of
+        this Collection's distinct printings (see key_counts())."""
+        keys = self.key_counts()[0]
+        okeys, ocounts = other.key_counts()[:2]
+        position = okeys.get_indexer(keys)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        counts[position >= 0] = ocounts[position[position >= 0]]
+        return counts
+    def from_counts(self, parts, name):
+        """Builds a Collection from (collection, rows, quantities) parts,
+        given by the first row of each printing and its number of copies."""
+        frames = []
+        for collection, rows, qty in parts:
+            keep = qty > 0
+            data = pd.DataFrame(collection.iloc[rows[keep]]).reset_index(
+                drop=True)
+            data['Qty'] = qty[keep]
+            frames.append(data)
+        frames = self.merge_categories(frames)
+        result = Collection(pd.concat(frames, ignore_index=True))
+        if not self.aggregated: result = result.expand()
+        result.name = name
+        return result
+    def intersect(self, other):
+        """Returns the cards held by both Collections (as many copies of each
+        printing as the Collection with fewer has)."""
+        keys, counts, first = self.key_counts()
+        shared = np.minimum(counts, self.counts_in(other))
+        return self.from_counts([(self, first, shared)],
+            f"{self.name} & {other.name}")
+    def subtract(self, other):
+        """Returns the cards of this Collection that aren't in the other, by
+        number of copies: e.g. deck.subtract(binder) are the cards still
+        needed for a deck."""
+        keys, counts, first = self.key_counts()
+        needed = np.maximum(counts - self.counts_in(other), 0)
+        return self.from_counts([(self, first, needed)],
+            f"{self.name} - {other.name}")
+    def merge(self, other):
+        """Returns the cards of both Collections together (with the copies of
+        each printing added up)."""
+        keys, counts, first = self.key_counts()
+        okeys, ocounts, ofirst = other.key_counts()
+        new = ~okeys.isin(keys)
+        return self.from_counts([(self, first, counts + self.counts_in(
+            other)), (other, ofirst[new], ocounts[new])],
+            f"{self.name} + {other.name}")
+    def diff(self, other):
+        """Returns the differences between two Collections, as the pair of
+        Collections (cards only here, cards only in the other), counting
+        copies of each printing."""
+        return self.subtract(other), other.subtract(self)
+
+    # Filtering ===============================================================
+    def filter_index(self):
+        """Returns the Collection's FilterIndex (see Filter.py), brought up
+        to date with any changes since it was last used."""
+        if self.filterindex is None: self.filterindex = FilterIndex(self)
+        else: self.filterindex.update(self)
+        return self.filterindex
+    def filter_mask(self, query):
+        """Returns a boolean array, true for the rows matching a filter
+        query, e.g. "bolt s:m10 c:r mv<=2" (see Filter.py)."""
+        return self.filter_index().mask(query)
+    def filtered(self, query):
+        """Returns a new Collection of the cards matching a filter query."""
+        data = pd.DataFrame(self[self.filter_mask(query)])
+        result = Collection(data.reset_index(drop=True))
+        result.name = self.name
+        return result
+        
+    # Analytics ===============================================================
+    def analytics(self):
+        """Returns the Analytics of the Collection's cards (see Analytics.py):
+        mana curve, color pips, rarity/set/color distributions and totals.
+        They are computed once, and then kept up to date as cards are added
+        and dropped (other changes have them computed again)."""
+        if self.tracked_analytics() is None:
+            self.analyticscache = Analytics(self)
+        return self.analyticscache
+    def tracked_analytics(self):
+        """Returns the Collection's Analytics if they are up to date (to be
+        updated along with a change), or None."""
+        analytics = self.analyticscache
+        if analytics is not None and analytics.current(self): return analytics
+        return None
+
     # Save/load functionality =================================================
+    # Collections are stored as ';' delimited csv by default, or in one of the
+    # binary formats (which need pyarrow installed) if the file extension
+    # calls for it. The binary formats store the column types directly.
+    formats = {'.csv':'csv', '.feather':'feather', '.arrow':'feather',
+        '.parquet':'parquet'}
+    # Other card list formats, that cards can be imported from and exported
+    # to, by name (see register_format() and Formats.py)
+    listformats = {}
+    @classmethod
+    def register_format(cls, name, extensions, reader=None, writer=None):
+        """Registers a card list format for files with the given extensions.
+        reader(fpath) should return the card data in a DataFrame (with the
+        Collection columns, and optionally 'Qty'), and writer(data, fpath)
+        should write such a DataFrame to file. Either may be omitted for
+        formats that can only be imported or exported."""
+        cls.listformats[name] = {'extensions':[e.lower() for e in
+            extensions], 'reader':reader, 'writer':writer}
+    @classmethod
+    def file_format(cls, fpath):
+        """Returns the storage format for a file path, by its extension."""
+        ext = os.path.splitext(fpath)[1].lower()
+        if ext in cls.formats: return cls.formats[ext]
+        for name, fmt in cls.listformats.items():
+            if ext in fmt['extensions']: return name
+        return 'csv'
+    @timed('collection.save')
     def save(self, fpath=None):
-        """Saves the collection as a ';' delimited csv file to the provided
-        location and updates the name of the collection accordingly. If a new
-        location is not provided, defaults to using the Collection's already
-        associated fpath. (If neither is set, nothing happens.)"""
+        """Saves the collection to the provided location and updates the name
+        of the collection accordingly. If a new location is not provided,
+        defaults to using the Collection's already associated fpath. (If
+        neither is set, nothing happens.) The file extension sets the format:
+        ';' delimited csv, or feather (.feather/.arrow) or parquet
+        (.parquet). A journaled Collection only appends its changes since the
+        last save (see enable_journal())."""
         if fpath: # If a new fpath is given, update collection fpath and name
-            self.fpath = fpath
-            self.name = (self.fpath.split("/")[-1]).split(".")[0]
-        if self.fpath:
+            self.set_fpath(fpath)
+        if self.journal is not None and self.journal.fpath == self.fpath \
+                and os.path.exists(self.fpath):
+            # Only the changes since the last save are written
+            self.journal.append()
+            if self.journal.needs_compaction():
+                self.journal.compact(self.drop(columns=['Sel']),
+                    self.write_data)
+        elif self.journal is not None:
+            # Saving to a new location starts a new journal there
+            self.journal = Journal(self.fpath, self.journal.compact_after)
+            self.journal.rewrite(self.drop(columns=['Sel']), self.write_data)
+        elif self.fpath:
             # Drop selection status column before saving
             data = self.drop(columns=['Sel'])
-            data.to_csv(self.fpath, index=False, sep=';')
+            self.write_data(data, self.fpath)
         # If neither exists, print a warning to stdout
         # (may replace with an actual warning or exception later)
         else: print(f"Warning: Collection {self.name} can't be saved - "+\
             "no file path specified.")
+    def set_fpath(self, fpath):
+        """Associates the collection with a file path, renaming it after the
+        file accordingly."""
+        self.fpath = fpath
+        self.name = (self.fpath.split("/")[-1]).split(".")[0]
     def reload(self):
         """Reloads the collection data from its associated file lococation
-        (replacing the current data)."""
+        (replacing the current data), replaying its journal if it has one."""
         if self.fpath:
-            data = pd.read_csv(self.fpath, sep=';')
+            journal = self.journal or Journal(self.fpath)
+            # Let any snapshot being written in the background finish first
+            journal.wait()
+            data = self.read_data(self.fpath)
             self.__init__(data, fpath=self.fpath)
+            if journal.exists():
+                journal.pending = []; self.journal = journal
+                self.replay(journal.read())
     @classmethod
+    @timed('collection.from_file')
     def from_file(cls, fpath):
-        """Loads a new collection object from a csv file."""
-        data = pd.read_csv(fpath, sep=';')
-        return cls(data, fpath=fpath)
+        """Loads a new collection object from a file (csv, feather or
+        parquet, by extension). If the file has a journal, its changes are
+        replayed and the Collection stays journaled. Collections imported
+        from another card manager's csv export are named after the file, but
+        not associated with it, so that saving them doesn't overwrite it."""
+        data = cls.read_data(fpath)
+        collection = cls(data, fpath=fpath)
+        if cls.is_export(fpath): collection.fpath = None
+        journal = Journal(fpath)
+        if journal.exists():
+            collection.journal = journal
+            collection.replay(journal.read())
+        return collection
+    @classmethod
+    def read_data(cls, fpath):
+        """Reads the card data stored at fpath into a DataFrame."""
+        fmt = cls.file_format(fpath)
+        if fmt in cls.listformats: return cls.import_list(fpath, fmt)
+        elif fmt == 'feather':
+            # Memory-mapped, so the columns are read (mostly) without copying
+            from pyarrow import feather
+            return feather.read_feather(fpath, memory_map=True)
+        elif fmt == 'parquet': return pd.read_parquet(fpath)
+        # Csv files exported by other card managers are imported instead
+        elif cls.is_export(fpath): return cls.import_list(fpath, 'export')
+        else: return pd.read_csv(fpath, sep=';')
+    @classmethod
+    def is_export(cls, fpath):
+        """Whether a file is a csv exported by another card manager, rather
+        than a Collection csv (with its ';' delimited header)."""
+        if cls.file_format(fpath) != 'csv': return False
+        with open(fpath, 'r', encoding='utf-8-sig') as fobj:
+            header = fobj.readline().strip().split(';')
+        return 'Name' not in header
+    @classmethod
+    def import_list(cls, fpath, fmt):
+        """Reads the card data of a file in one of the registered card list
+        formats."""
+        reader = cls.listformats[fmt]['reader']
+        if reader is None: raise ValueError(f"Can't import {fmt} files.")
+        return reader(fpath)
+    @classmethod
+    @timed('collection.write_data')
+    def write_data(cls, data, fpath):
+        """Writes a DataFrame of card data to fpath."""
+        fmt = cls.file_format(fpath)
+        if fmt in cls.listformats:
+            writer = cls.listformats[fmt]['writer']
+            if writer is None: raise ValueError(f"Can't export {fmt} files.")
+            return writer(data, fpath)
+        # The binary formats need a default (0 to n-1) index
+        if fmt != 'csv': data = data.reset_index(drop=True)
+        # Feather files are left uncompressed so they can be memory-mapped
+        if fmt == 'feather': data.to_feather(fpath, compression='uncompressed')
+        elif fmt == 'parquet':
+            data.to_parquet(fpath, index=False, compression='zstd')
+        else: data.to_csv(fpath, index=False, sep=';')
+
+    # Journaled storage =======================================================
+    # A journaled Collection is saved by appending its changes (added and
+    # dropped cards, sorts and edited values) to a log next to its file,
+    # which is folded back into the file in the background once it grows
+    # long (see Journal.py). Loading the Collection replays the log.
+    def enable_journal(self, compact_after=500):
+        """Switches the Collection to journaled storage, saving it in full
+        first. (The Collection must have a file path.)"""
+        if not self.fpath:
+            raise ValueError(f"Collection {self.name} has no file path.")
+        self.journal = Journal(self.fpath, compact_after)
+        self.journal.rewrite(self.drop(columns=['Sel']), self.write_data)
+    def record(self, op, **fields):
+        """Records a change in the journal, if the Collection has one."""
+        if self.journal is not None: self.journal.record(op, **fields)
+    @staticmethod
+    def to_record(frame):
+        """Returns the cards of a frame in a json-compatible form."""
+        return json.loads(frame.drop(columns=['Sel']).to_json(orient='split',
+            index=False, date_format='iso', date_unit='ns'))
+    def replay(self, ops):
+        """Applies a list of logged changes to the Collection, in order
+        (without logging them again)."""
+        journal = self.journal; self.journal = None
+        try:
+            for op in ops: self.apply_change(op)
+        finally: self.journal = journal
+        self['Sel'] = False
+    def apply_change(self, op):
+        """Applies one logged change to the Collection."""
+        if op['op'] == 'add':
+            self.add_cards(*[Collection(cards['data'],
+                columns=cards['columns']) for cards in op['cards']])
+        elif op['op'] == 'drop':
+            selected = np.zeros(len(self), dtype=bool)
+            selected[op['rows']] = True
+            self['Sel'] = selected; self.drop_selected(op['count'])
+        elif op['op'] == 'sort': self.sort_by(op['columns'], op['ascending'])
+        elif op['op'] == 'column': self.add_column(op['column'])
+        elif op['op'] == 'set':
+            dtype = self[op['column']].dtype
+            values = pd.Series(op['values'], dtype=object)
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                values = pd.to_datetime(values).to_numpy('datetime64[ns]')
+            elif pd.api.types.is_numeric_dtype(dtype):
+                values = pd.to_numeric(values).to_numpy()
+            else: values = values.to_numpy()
+            self.set_values(op['column'], op['rows'], values)
+        else: raise ValueError(f"Unknown journal entry: {op['op']}")
+    def add_column(self, column):
+        """Adds an (empty) optional column to the Collection."""
+        self.record('column', column=column)
+        self[column] = pd.Series(index=self.index,
+            dtype=self.optional[column])
+        self.changed()
         
     # Scryfall Connectors =====================================================
+    # (Search, and with it requests, is imported on first use, so that
+    # scripts working with saved Collections start without it.)
     @classmethod
-    def from_search(cls, query, name="Search results"):
+    def from_search(cls, query, name="Search results", database=None):
         """Creates a Collection from the results of a Scryfall search with the
-        given query. For query syntax see https://scryfall.com/docs/syntax."""
-        # Perform the search using the Scryfall portal object.
-        portal = ScryfallPortal(); data = portal.search(query)
+        given query. For query syntax see https://scryfall.com/docs/syntax.
+        If an offline CardDatabase (see BulkData.py) is given, the search is
+        answered locally instead, with no limit on the number of cards."""
+        # Perform the search locally if a database is available
+        if database is not None: data = database.search(query)
+        # Otherwise perform the search using the Scryfall portal object.
+        else:
+            from Search import ScryfallPortal
+            portal = ScryfallPortal(); data = portal.search(query)
         results = cls(data, fpath=None); results.name = "Search Results"
         return results
+    @timed('collection.refresh')
+    def refresh(self, max_age=7*24*3600, prices=True, portal=None):
+        """Updates the card data (and prices, in a 'Price' column) of the
+        Collection in place from Scryfall, requesting each distinct name/set
+        pair once through the /cards/collection endpoint in batches of 75.
+        Rows refreshed within the last (max_age) seconds are skipped, and only
+        the values that have changed are written. Returns a summary of the
+        refresh: the number of stale rows, of rows refreshed and of rows
+        with changed values, and the identifiers Scryfall could not find."""
+        now = pd.Timestamp.now()
+        if 'Refreshed' in self.columns: refreshed = self['Refreshed']
+        else: refreshed = pd.Series(pd.NaT, index=self.index,
+            dtype='datetime64[ns]')
+        stale = (refreshed.isna() | (refreshed < now -
+            pd.Timedelta(seconds=max_age))).to_numpy()
+        summary = {'rows':int(stale.sum()), 'requested':0, 'refreshed':0,
+            'updated':0, 'not_found':[]}
+        if not stale.any(): return summary
+        # Index the stale rows by their (lowercase) name and set
+        names = self['Name'].to_numpy()[stale]
+        sets = self['Set'].astype(str).to_numpy()[stale]
+        keys = pd.Index([f'{n.lower()}|{s.lower()}' for n, s in
+            zip(names, sets)])
+        first = ~keys.duplicated()
+        identifiers = [{'name':n, 'set':s.lower()} for n, s in
+            zip(names[first], sets[first])]
+        summary['requested'] = len(identifiers)
+        if portal is None:
+            from Search import ScryfallPortal
+            portal = ScryfallPortal()
+        cards, summary['not_found'] = portal.fetch_cards(identifiers)
+        if not cards: return summary
+        found = Collection(portal.format_result(cards))
+        found['Price'] = pd.to_numeric(pd.Series([(c.get('prices') or
+            {}).get('usd') for c in cards]), errors='coerce').to_numpy()
+        found.index = pd.Index([f'{n.lower()}|{s.lower()}' for n, s in
+            zip(found['Name'], found['Set'].astype(str))])
+        found = found[~found.index.duplicated()]
+        # Positions (in the Collection) of the stale rows that were found
+        match = found.index.get_indexer(keys)
+        rows = np.flatnonzero(stale)[match >= 0]; match = match[match >= 0]
+        fields = ['Cost', 'Rarity', 'MV', 'Color', 'Released']
+        if prices:
+            if 'Price' not in self.columns: self.add_column('Price')
+            fields.append('Price')
+        changed = np.zeros(len(self), dtype=bool)
+        for field in fields:
+            old = self[field].to_numpy()[rows]
+            new = found[field].to_numpy()[match]
+            if isinstance(self[field].dtype, pd.CategoricalDtype):
+                old = old.astype(str); new = new.astype(str)
+            differs = ~((old == new) | (pd.isna(old) & pd.isna(new)))
+            if differs.any():
+                self.set_values(field, rows[differs], new[differs])
+                changed[rows[differs]] = True
+        if 'Refreshed' not in self.columns: self.add_column('Refreshed')
+        self.set_values('Refreshed', rows, np.full(len(rows),
+            now.to_datetime64()))
+        summary['refreshed'] = len(rows)
+        summary['updated'] = int(changed.sum())
+        return summary
+    def set_values(self, column, rows, values):
+        """Sets the values of a column at the given row positions, keeping
+        the column's type (and category order)."""
+        if self.journal is not None:
+            self.record('set', column=column, rows=np.asarray(rows).tolist(),
+                values=json.loads(pd.Series(values).to_json(orient='values',
+                date_format='iso', date_unit='ns')))
+        data = self[column]
+        if isinstance(data.dtype, pd.CategoricalDtype):
+            values = pd.Series(values, dtype=object)
+            new = pd.Index(values.unique()).difference(data.cat.categories)
+            if len(new): data = data.cat.add_categories(new)
+            data = data.copy(); data.iloc[rows] = values.to_numpy()
+            order = {'Rarity':RARITY_ORDER, 'Color':COLOR_ORDER}.get(column)
+            self[column] = self.categorize(data, order)
+        else:
+            data = data.to_numpy(copy=True); data[rows] = values
+            self[column] = data
+        self.changed()
+    @classmethod
+    def stream_search(cls, query, maxcards=None):
+        """Yields the results of a Scryfall search as a series of Collections,
+        one per page of results (175 cards), as each page arrives."""
+        from Search import ScryfallPortal
+        portal = ScryfallPortal()
+        for data in portal.iter_search(query, maxcards=maxcards):
+            chunk = cls(data, fpath=None); chunk.name = "Search Results"
+            yield chunk
+    def add_search(self, query, maxcards=None):
+        """Adds the results of a Scryfall search to this Collection page by
+        page, yielding each page's Collection after it has been added (so the
+        caller can work on the cards already present while the rest of the
+        search is pulled)."""
+        for chunk in self.stream_search(query, maxcards=maxcards):
+            self.add_cards(chunk)
+            yield chunk
+
+# Card list formats (see Formats.py)
+Collection.register_format('dec', ['.dec'], read_list, write_dec)
+Collection.register_format('list', ['.txt'], read_list, write_list)
+Collection.register_format('export', [], read_export)
+
+def convert_library(directory="Library/", ext=".feather", remove=False):
+    """Converts every Collection file in a directory to the format given by
+    ext (e.g. '.feather', '.parquet' or '.csv'), optionally removing the
+    original files. Returns the list of new file paths. (If a collection is
+    stored in more than one format, only the first one found is used.)"""
+    converted = []; done = set()
+    for fname in sorted(os.listdir(directory)):
+        root, old = os.path.splitext(fname)
+        if old.lower() not in Collection.formats or old.lower() == ext or \
+                root in done:
+            continue
+        done.add(root)
+        fpath = os.path.join(directory, fname)
+        collection = Collection.from_file(fpath)
+        collection.journal = None # (the new file is saved in full)
+        collection.save(os.path.join(directory, root + ext))
+        converted.append(collection.fpath)
+        if remove:
+            for path in [fpath, fpath + ".journal"]:
+                if os.path.exists(path): os.remove(path)
+    return converted
 
 if __name__ == "__main__":
     
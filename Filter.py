@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 01:00:58 2026
+
+This module contains the FilterIndex, which narrows down the rows of an open
+Collection as a filter query is typed (see Collection.filter_mask()). Card
+names are matched through an n-gram index of the Collection's distinct
+names, and set, color, rarity and mana value through boolean masks built
+from the category codes of those columns, so that no strings are rescanned
+per keystroke.
+
+Queries mix words to find in the card names with Scryfall-like criteria:
+    "bolt s:m10 c:r r>=u mv<=2"
+for set (s:, e:, set:), color (c:, color:), rarity (r:, rarity:) and mana
+value (mv, cmc). Several set codes or rarities may be given at once (s:m10,
+m11), and colors are compared as in Scryfall (c: and c>= for at least those
+colors, c= for exactly, c<= for at most).
+
+@author: Joe Raso
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from Cards import RARITY_ORDER
+
+# Query parsing ===============================================================
+CRITERION = re.compile(r'^(s|e|set|c|color|r|rarity|mv|cmc)(:|=|<=|>=|<|>)'
+    r'(\S+)$', re.IGNORECASE)
+FIELDS = {'s':'set', 'e':'set', 'set':'set', 'c':'color', 'color':'color',
+    'r':'rarity', 'rarity':'rarity', 'mv':'mv', 'cmc':'mv'}
+def parse_query(query):
+    """Splits a filter query into the words to find in card names and a list
+    of (field, operator, value) criteria."""
+    words, criteria = [], []
+    for term in query.lower().split():
+        match = CRITERION.match(term)
+        if match is None: words.append(term.strip('"')); continue
+        field, op, value = FIELDS[match[1]], match[2], match[3]
+        criteria.append((field, op, value))
+    return [w for w in words if w], criteria
+def compare(values, op, value):
+    """Compares an array to a value with one of the query operators."""
+    if op in (':', '='): return values == value
+    elif op == '<': return values < value
+    elif op == '>': return values > value
+    elif op == '<=': return values <= value
+    else: return values >= value
+
+def gram_codes(names):
+    """Returns the n-grams (substrings of up to three letters) of a list of
+    names as integer codes, in a (name, position) array (-1 past the end of
+    each name), along with the letters the codes are built from. Letters
+    are numbered from 1, and an n-gram's code holds one base (letters+1)
+    digit per letter, so n-grams of every length are told apart."""
+    chars = np.array(names, dtype=str)
+    width = chars.dtype.itemsize//4
+    points = chars.view(np.uint32).reshape(len(names), width)
+    # Number the letters used (0 is the padding past the end of a name)
+    present = np.zeros(int(points.max())+1, dtype=bool); present[points] = True
+    present[0] = True
+    letters = np.flatnonzero(present); letters = letters[letters > 0]
+    digits = np.cumsum(present).astype(np.int64) - 1
+    digits = digits[points]
+    base = len(letters) + 1
+    codes = []
+    for n in range(1, 4):
+        if width < n: break
+        grams = np.zeros((len(names), width-n+1), dtype=np.int64)
+        for j in range(n): grams = grams*base + digits[:, j:width-n+1+j]
+        # (n-grams running past the end of a name end in padding)
+        grams[digits[:, n-1:] == 0] = -1
+        codes.append(grams)
+    return np.concatenate(codes, axis=1), letters, base
+def gram_text(code, letters, base):
+    """Returns the n-gram (text) of a code from gram_codes()."""
+    text = ""
+    while code:
+        code, digit = divmod(code, base)
+        text = chr(letters[digit-1]) + text
+    return text
+def word_grams(word):
+    """Returns the n-grams every name containing a word must contain (the
+    word itself if it is short enough to be indexed)."""
+    return [word] if len(word) <= 3 else [word[i:i+3] for i in
+        range(len(word)-2)]
+
+# The index ===================================================================
+class FilterIndex:
+    """Index of a Collection's rows for filtering. Names are factorized into
+    the distinct lowercase names (each row holding the code of its name),
+    and every substring of up to three letters (n-gram) points to the
+    sorted codes of the names containing it.
+    The index is brought up to date after the Collection changes with
+    update(), which only indexes names it hasn't seen before."""
+    def __init__(self, collection):
+        self.names = pd.Index([], dtype=object)
+        self.series = pd.Series(self.names)
+        self.grams = {}
+        # The last names query, and the codes of the names it matched
+        self.last = ((), None)
+        self.version = None
+        self.update(collection)
+    def update(self, collection):
+        """Re-reads the rows of the Collection if it has changed."""
+        if self.version == (collection.version, len(collection)): return
+        lowered = collection['Name'].astype(str).str.lower().to_numpy(
+            dtype=object)
+        codes = self.names.get_indexer(lowered)
+        missing = codes < 0
+        if missing.any():
+            # New names are numbered after the ones already indexed
+            new, names = pd.factorize(lowered[missing])
+            codes[missing] = new + len(self.names)
+            self.add_names(np.asarray(names, dtype=object))
+        self.codes = codes
+        # Category codes of the other columns (-1 for missing values)
+        self.categories = {column:(collection[column].cat.categories,
+            collection[column].cat.codes.to_numpy()) for column in
+            ['Set', 'Color', 'Rarity']}
+        self.mv = collection['MV'].to_numpy()
+        self.version = (collection.version, len(collection))
+    def add_names(self, names, chunksize=10000):
+        """Adds new (distinct, lowercase) names to the n-gram index, a chunk
+        of names at a time."""
+        for start in range(0, len(names), chunksize):
+            first = len(self.names) + start
+            grams, letters, base = gram_codes(names[start:start+chunksize])
+            # Each name's distinct n-grams, then (name code) postings grouped
+            # by n-gram, in order, through one sort of (n-gram, name) pairs
+            grams.sort(axis=1)
+            keep = grams >= 0
+            keep[:, 1:] &= grams[:, 1:] != grams[:, :-1]
+            count = len(keep)
+            pairs = np.sort(grams[keep]*count + np.nonzero(keep)[0])
+            if len(pairs) == 0: continue # (only empty names)
+            grams = pairs // count
+            rows = (pairs % count).astype(np.int32) + first
+            bounds = np.append(np.flatnonzero(np.diff(grams)) + 1,
+                len(grams))
+            # New codes are all larger than the existing ones, so the
+            # postings stay sorted when appended to
+            for begin, end in zip(np.append(0, bounds[:-1]), bounds):
+                gram = gram_text(int(grams[begin]), letters, base)
+                added = rows[begin:end]
+                self.grams[gram] = np.concatenate([self.grams[gram],
+                    added]) if gram in self.grams else added
+        self.names = self.names.append(pd.Index(names, dtype=object))
+        self.series = pd.Series(self.names)
+        self.last = ((), None)
+
+    # Filtering ===============================================================
+    def match_names(self, words):
+        """Returns a boolean array over the distinct names, true for names
+        containing every word. Candidates are the intersection of the
+        postings of the words' n-grams (and of the previous query's matches,
+        if it was narrower, e.g. while typing); only words longer than the
+        n-grams need to be checked against the candidates in full (and not
+        those already checked by the previous query)."""
+        words = tuple(words)
+        previous, matched = self.last
+        if words == previous: return self.found
+        postings = sorted((self.grams.get(gram, np.empty(0, np.int32))
+            for word in words for gram in word_grams(word)), key=len)
+        narrower = matched is not None and all(any(p in w for w in words)
+            for p in previous)
+        if narrower: postings.insert(0, matched)
+        candidates = postings[0]
+        for other in postings[1:]:
+            if len(candidates) == 0: break
+            candidates = np.intersect1d(candidates, other,
+                assume_unique=True)
+        for word in words:
+            if len(word) <= 3 or len(candidates) == 0: continue
+            if narrower and any(word in p for p in previous): continue
+            candidates = candidates[self.series.iloc[candidates].str.contains(
+                word, regex=False).to_numpy()]
+        self.last = (words, candidates)
+        self.found = np.zeros(len(self.names), dtype=bool)
+        self.found[candidates] = True
+        return self.found
+    def category_mask(self, column, wanted):
+        """Returns the row mask of a categorical column, given a boolean
+        array of the wanted categories."""
+        codes = self.categories[column][1]
+        # Missing values (code -1) pick the appended False
+        return np.append(wanted, False)[codes]
+    def criterion_mask(self, field, op, value):
+        """Returns the row mask of one (field, operator, value) criterion."""
+        if field == 'mv':
+            try: return compare(self.mv, op, int(value))
+            except ValueError: return np.zeros(len(self.mv), dtype=bool)
+        if field == 'set':
+            categories = self.categories['Set'][0].astype(str).str.lower()
+            return self.category_mask('Set', categories.isin(
+                value.split(',')))
+        if field == 'rarity':
+            categories = self.categories['Rarity'][0].astype(str)
+            ranks = np.array([RARITY_ORDER.index(c) if c in RARITY_ORDER
+                else -1 for c in categories])
+            codes = [r[0].upper() for r in value.split(',') if r]
+            wanted = np.zeros(len(categories), dtype=bool)
+            for code in codes:
+                if code in RARITY_ORDER: wanted |= compare(ranks, op,
+                    RARITY_ORDER.index(code)) & (ranks >= 0)
+            return self.category_mask('Rarity', wanted)
+        # Colors are compared as sets of letters ('c' for colorless)
+        letters = set(value.upper()) - {'C'}
+        if op == ':': op = '=' if not letters else '>='
+        colors = [set(c) for c in self.categories['Color'][0].astype(str)]
+        if op == '=': wanted = [c == letters for c in colors]
+        elif op == '>=': wanted = [c >= letters for c in colors]
+        elif op == '<=': wanted = [c <= letters for c in colors]
+        elif op == '>': wanted = [c > letters for c in colors]
+        else: wanted = [c < letters for c in colors]
+        return self.category_mask('Color', np.array(wanted, dtype=bool))
+    def mask(self, query):
+        """Returns a boolean array over the Collection's rows, true for the
+        rows matching a filter query."""
+        words, criteria = parse_query(query)
+        mask = np.ones(len(self.codes), dtype=bool)
+        if words: mask &= self.match_names(words)[self.codes]
+        for field, op, value in criteria:
+            mask &= self.criterion_mask(field, op, value)
+        return mask
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:48:21 2026
+
+This module contains the readers and writers for the card list formats
+ScrollRack can import and export besides its own Collection files: MTGO
+.dec files, MTG Arena and plain text lists ("4 Card Name (SET) 123") and the
+csv exports of other collection managers. (They are registered with the
+Collection class at the end of Collection.py.)
+
+Lists are read line by line, in chunks, and the card names of each chunk are
+resolved to full card data in a single batch - from a local CardDatabase if
+one has been built (see BulkData.py), or otherwise from Scryfall, 75 cards
+per request.
+
+@author: Joe Raso
+"""
+
+import os, re, csv
+from itertools import islice
+import numpy as np
+import pandas as pd
+
+# Resolving card names ========================================================
+class CardResolver:
+    """Resolves card names (with optional set codes), as found in imported
+    card lists, to full card data. Names are looked up in a local table: the
+    whole of a CardDatabase if one is given, otherwise the cards fetched from
+    Scryfall so far (so each distinct card is only requested once). Names may
+    be given as the card's full name or its front face's."""
+    columns = ['Name', 'Cost', 'Set', 'Rarity', 'MV', 'Color', 'Released']
+    # The resolver used by default, shared by all imports
+    shared = None
+    def __init__(self, database=None, portal=None):
+        self.online = database is None
+        self.portal = portal
+        if database is not None:
+            self.table = database.cards[self.columns].reset_index(drop=True)
+        else: self.table = pd.DataFrame(columns=self.columns)
+        self.build_index()
+    @classmethod
+    def default(cls, dbpath="Cache/cards.pkl"):
+        """Returns the shared resolver, which uses the local CardDatabase if
+        one has been saved at dbpath, and Scryfall otherwise."""
+        if cls.shared is None:
+            from BulkData import CardDatabase
+            database = CardDatabase.load(dbpath) if os.path.exists(dbpath) \
+                else None
+            cls.shared = cls(database)
+        return cls.shared
+    def build_index(self):
+        """Indexes the table by lowercase name|set and name| keys (for both
+        full and front face names), pointing to the first row of each."""
+        names = self.table['Name'].astype(str).str.lower()
+        front = names.str.split(' // ').str[0].to_numpy(dtype=object)
+        names = names.to_numpy(dtype=object)
+        sets = '|' + self.table['Set'].astype(str).str.lower().to_numpy(
+            dtype=object)
+        keys = np.concatenate([names + sets, front + sets, names + '|',
+            front + '|'])
+        positions = np.tile(np.arange(len(self.table)), 4)
+        first = ~pd.Index(keys).duplicated()
+        self.index = pd.Index(keys[first]); self.positions = positions[first]
+    def lookup(self, names, sets):
+        """Returns the table rows of the given names/sets (-1 where there is
+        no match). A card not found in the given set matches any printing."""
+        position = self.index.get_indexer([f'{n}|{s}' for n, s in
+            zip(names, sets)])
+        unmatched = position < 0
+        if unmatched.any():
+            position[unmatched] = self.index.get_indexer([f'{n}|' for n in
+                np.asarray(names, dtype=object)[unmatched]])
+        found = position >= 0
+        rows = np.full(len(position), -1)
+        rows[found] = self.positions[position[found]]
+        return rows
+    def fetch(self, names, sets):
+        """Fetches the given (distinct) cards from Scryfall, in batches of 75,
+        and adds them to the table. Cards not found in their set are
+        requested again by name only."""
+        from Search import ScryfallPortal
+        portal = self.portal or ScryfallPortal()
+        identifiers = [{'name':n, 'set':s} if s else {'name':n}
+            for n, s in zip(names, sets)]
+        cards, missing = portal.fetch_cards(identifiers)
+        retry = [{'name':i['name']} for i in missing if 'set' in i]
+        if retry: cards += portal.fetch_cards(retry)[0]
+        if not cards: return
+        found = portal.format_result(cards)[self.columns]
+        self.table = pd.concat([self.table, found], ignore_index=True)
+        self.build_index()
+    def resolve(self, names, sets):
+        """Returns the card data for lists of names and set codes, as a
+        DataFrame in the same order. Cards that could not be found keep just
+        their name and set."""
+        names = [str(n).strip() for n in names]
+        sets = [str(s).strip().lower() for s in sets]
+        lowered = [n.lower() for n in names]
+        rows = self.lookup(lowered, sets)
+        if self.online and (rows < 0).any():
+            # Request each distinct missing card once
+            unknown = pd.unique(np.array([f'{n}|{s}' for n, s, r in
+                zip(names, sets, rows) if r < 0], dtype=object))
+            pairs = [key.rsplit('|', 1) for key in unknown]
+            self.fetch([p[0] for p in pairs], [p[1] for p in pairs])
+            rows = self.lookup(lowered, sets)
+        found = rows >= 0
+        data = self.table.iloc[np.where(found, rows, 0)].reset_index(
+            drop=True) if len(self.table) else pd.DataFrame(
+            columns=self.columns, index=range(len(rows)))
+        if not found.all():
+            data = data.astype(object)
+            data.loc[~found, :] = None
+            data.loc[~found, 'Name'] = np.array(names, dtype=object)[~found]
+            data.loc[~found, 'Set'] = [s.upper() for s, f in
+                zip(sets, found) if not f]
+            print(f"Warning: {int((~found).sum())} card(s) could not be "
+                "identified.")
+        return data
+
+# Readers =====================================================================
+# A list line: an optional 'SB:' (sideboard) marker, a count, the card name,
+# and optionally a set code in parentheses or brackets and a collector number
+LIST_LINE = re.compile(r'^(?:SB:\s*)?(\d+)x?\s+(.+?)'
+    r'(?:\s+[\(\[](\w+)[\)\]](?:\s+(\S+))?)?\s*$')
+def iter_list(lines):
+    """Yields the (count, name, set code) of each card line of a text card
+    list. Comments, blank lines and section headers ('Deck', 'Sideboard'...)
+    are skipped."""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(('//', '#')): continue
+        match = LIST_LINE.match(line)
+        if match: yield int(match[1]), match[2], match[3] or ''
+def resolve_chunks(entries, resolver=None, chunksize=5000):
+    """Resolves an iterable of (count, name, set code) entries in chunks,
+    returning the card data with quantities ('Qty'), one row per card."""
+    resolver = resolver or CardResolver.default()
+    chunks = []
+    while True:
+        chunk = list(islice(entries, chunksize))
+        if not chunk: break
+        counts, names, sets = zip(*chunk)
+        data = resolver.resolve(names, sets)
+        data['Qty'] = np.array(counts, dtype=np.int32)
+        chunks.append(data)
+    if not chunks: return pd.DataFrame(columns=CardResolver.columns+['Qty'])
+    data = pd.concat(chunks, ignore_index=True)
+    # The same card may be listed more than once (e.g. in the sideboard)
+    key = data['Name'].astype(str).str.lower() + '|' + \
+        data['Set'].astype(str).str.lower()
+    qty = data['Qty'].groupby(key.to_numpy(), sort=False).sum()
+    data = data[~key.duplicated().to_numpy()].reset_index(drop=True)
+    data['Qty'] = qty.to_numpy()
+    return data
+def read_list(fpath, resolver=None):
+    """Reads a text card list: MTGO .dec files, MTG Arena exports, and plain
+    lists of "4 Card Name", "4x Card Name (SET)" or "4 Card Name (SET) 123"
+    lines. (Sideboards are merged into the list.)"""
+    with open(fpath, 'r', encoding='utf-8-sig') as fobj:
+        return resolve_chunks(iter_list(fobj), resolver)
+
+# Column names used by other collection managers' csv exports (lowercase),
+# in order of preference
+EXPORT_COLUMNS = {
+    'Qty':['quantity', 'qty', 'count', 'amount', 'copies'],
+    'Name':['name', 'card name', 'card', 'cardname'],
+    'Set':['set code', 'setcode', 'edition code', 'set', 'edition']}
+def read_export(fpath, resolver=None, chunksize=5000):
+    """Reads a csv file exported by another collection manager (Deckbox,
+    Moxfield, ManaBox, etc.), using its count, name and set columns."""
+    with open(fpath, 'r', encoding='utf-8-sig', newline='') as fobj:
+        dialect = csv.Sniffer().sniff(fobj.readline(), delimiters=',;\t')
+    chunks = pd.read_csv(fpath, sep=dialect.delimiter, dtype=str,
+        chunksize=chunksize, encoding='utf-8-sig')
+    def entries():
+        for chunk in chunks:
+            columns = {c.strip().lower():c for c in chunk.columns}
+            found = {field:next((columns[a] for a in aliases if a in columns),
+                None) for field, aliases in EXPORT_COLUMNS.items()}
+            if found['Name'] is None:
+                raise ValueError(f"No card name column found in {fpath}.")
+            names = chunk[found['Name']].fillna('')
+            counts = pd.to_numeric(chunk[found['Qty']], errors='coerce'
+                ).fillna(1).astype(int) if found['Qty'] else \
+                pd.Series(1, index=chunk.index)
+            sets = chunk[found['Set']].fillna('') if found['Set'] else \
+                pd.Series('', index=chunk.index)
+            for count, name, code in zip(counts, names, sets):
+                if name: yield count, name, code
+    return resolve_chunks(entries(), resolver, chunksize)
+
+# Writers =====================================================================
+def card_quantities(data):
+    """Returns the names, set codes and counts of the cards in a DataFrame of
+    card data (with or without quantities), one row per name and set."""
+    qty = data['Qty'] if 'Qty' in data.columns else \
+        pd.Series(1, index=data.index)
+    grouped = pd.DataFrame({'Name':data['Name'].astype(str),
+        'Set':data['Set'].astype(str), 'Qty':qty.to_numpy()})
+    return grouped.groupby(['Name', 'Set'], sort=False)['Qty'].sum(
+        ).reset_index()
+def write_dec(data, fpath):
+    """Writes card data as an MTGO .dec list ("4 Card Name" lines)."""
+    cards = card_quantities(data)
+    cards = cards.groupby('Name', sort=False)['Qty'].sum().reset_index()
+    with open(fpath, 'w', encoding='utf-8') as fobj:
+        fobj.writelines(f"{qty} {name}\n" for name, qty in
+            zip(cards['Name'], cards['Qty']))
+def write_list(data, fpath):
+    """Writes card data as a text list of "4 Card Name (SET)" lines (which
+    MTG Arena and most deck sites can import)."""
+    cards = card_quantities(data)
+    with open(fpath, 'w', encoding='utf-8') as fobj:
+        fobj.writelines(f"{qty} {name} ({code})\n" if code else
+            f"{qty} {name}\n" for name, code, qty in
+            zip(cards['Name'], cards['Set'], cards['Qty']))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:40:07 2026
+
+This module contains the background jobs used by the GUI to run Scryfall
+searches and Collection file I/O off of the GUI thread, so that the window
+stays responsive while they run. (Collection is imported by the jobs
+themselves, the first time one runs, so that the GUI starts without it.)
+
+@author: Joe Raso
+"""
+
+import os, threading, itertools
+from Metrics import Metrics
+from PyQt5 import QtCore
+
+class JobSignals(QtCore.QObject):
+    """Signals emitted by a Job. (QRunnables can't emit signals themselves.)
+    Since this object lives in the GUI thread, connected slots are run there
+    as well."""
+    # Progress as (steps completed, cards so far) and a status message
+    progress = QtCore.pyqtSignal(int, int, str)
+    # A partial result (e.g. one page of search results)
+    chunk = QtCore.pyqtSignal(object)
+    # The final result (also emitted, as None, when cancelled)
+    finished = QtCore.pyqtSignal(object)
+    # An error message, if the job failed
+    failed = QtCore.pyqtSignal(str)
+
+class Job(QtCore.QRunnable):
+    """A unit of background work, to be started on a QThreadPool. Subclasses
+    implement work(), which should check self.cancelled between steps. The
+    action names the job for profiling (see Metrics.profile())."""
+    action = "job"
+    def __init__(self, description=""):
+        super().__init__()
+        self.description = description
+        self.signals = JobSignals()
+        self.cancelled = False; self.done = False
+        # The Job object is kept by its owner, not deleted by the pool
+        self.setAutoDelete(False)
+    def cancel(self):
+        """Asks the job to stop at its next opportunity."""
+        self.cancelled = True
+    def run(self):
+        try:
+            with Metrics.timer(f"job.{self.action}"), \
+                    Metrics.profile(self.action):
+                result = self.work()
+        except Exception as error:
+            self.done = True
+            self.signals.failed.emit(f"{self.description} failed: {error}")
+            return
+        self.done = True
+        self.signals.finished.emit(None if self.cancelled else result)
+    def work(self):
+        raise NotImplementedError
+
+class SearchJob(Job):
+    """Runs a Scryfall search, emitting each page of results (as a Collection)
+    as soon as it arrives."""
+    action = "search"
+    def __init__(self, query, maxcards=None):
+        super().__init__(f"Search '{query}'")
+        self.query = query; self.maxcards = maxcards
+    def work(self):
+        from Collection import Collection
+        pages = Collection.stream_search(self.query, maxcards=self.maxcards)
+        npages = 0; ncards = 0
+        try:
+            for chunk in pages:
+                if self.cancelled: break
+                npages += 1; ncards += len(chunk)
+                self.signals.chunk.emit(chunk)
+                message = f"{self.description}: {npages} page(s), " \
+                    f"{ncards} cards"
+                self.signals.progress.emit(npages, ncards, message)
+        # Stops fetching further pages if the search was cancelled
+        finally: pages.close()
+        return ncards
+
+class LoadJob(Job):
+    """Loads a Collection from file."""
+    action = "open"
+    def __init__(self, fpath):
+        super().__init__(f"Open {fpath}")
+        self.fpath = fpath
+    def work(self):
+        from Collection import Collection
+        return Collection.from_file(self.fpath)
+
+class SaveJob(Job):
+    """Writes a Collection's data to file. The data to save is taken when the
+    job is created (in the GUI thread), so the Collection can keep being
+    edited while it is written. The data is written to a temporary file that
+    then replaces the target, so an interrupted save leaves the old file
+    whole, and saves to the same path run one at a time (an older save
+    finishing after a newer one is skipped)."""
+    action = "save"
+    # Per path: a lock, and the number of the last save written
+    locks = {}; written = {}
+    count = itertools.count()
+    def __init__(self, collection, fpath):
+        super().__init__(f"Save {fpath}")
+        self.fpath = fpath; self.number = next(self.count)
+        # Drop selection status column before saving
+        self.data = collection.drop(columns=['Sel'])
+    def work(self):
+        from Collection import Collection
+        root, ext = os.path.splitext(self.fpath)
+        with self.locks.setdefault(self.fpath, threading.Lock()):
+            if self.written.get(self.fpath, -1) > self.number:
+                return self.fpath
+            tmppath = root + ".tmp" + ext
+            Collection.write_data(self.data, tmppath)
+            os.replace(tmppath, self.fpath)
+            self.written[self.fpath] = self.number
+        return self.fpath
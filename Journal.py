@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:46:01 2026
+
+This module contains the Journal object, an append-only log of the changes
+made to a Collection since it was last saved in full. Saving a journaled
+Collection only appends its new changes to the log, and the log is folded
+back into the saved file (compacted) in the background once it grows long.
+
+@author: Joe Raso
+"""
+
+import os, json, hashlib, threading
+
+class Journal:
+    """The change log kept next to a Collection's file (at fpath.journal).
+    The first line of the log records the hash of the snapshot (the saved
+    Collection file) it applies to, and each following line is one change
+    (operation), as json. Replacing the snapshot and its log is done through
+    temporary files, so that a crash at any point leaves a snapshot and a log
+    that can be replayed to reach the last saved state."""
+    def __init__(self, fpath, compact_after=500):
+        self.fpath = fpath
+        self.logpath = fpath + ".journal"
+        # Snapshots are written here first (keeping the format's extension)
+        root, ext = os.path.splitext(fpath)
+        self.tmppath = root + ".tmp" + ext
+        self.compact_after = compact_after
+        # Changes made since the last save, not yet written to the log
+        self.pending = []
+        # Number of changes in the log, and the lock guarding it
+        self.nlogged = 0
+        self.lock = threading.Lock()
+        self.compacting = None
+
+    # Recording changes =======================================================
+    def record(self, op, **fields):
+        """Records a change to the Collection, to be written on next save."""
+        fields['op'] = op
+        self.pending.append(fields)
+    def exists(self):
+        """Whether a log (applying to the current snapshot) exists on disk."""
+        return os.path.exists(self.logpath) or \
+            os.path.exists(self.logpath + ".tmp")
+    @staticmethod
+    def file_hash(fpath):
+        """Returns the (sha1) hash of a file's contents."""
+        digest = hashlib.sha1()
+        with open(fpath, 'rb') as fobj:
+            for block in iter(lambda: fobj.read(2**20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    # Reading and writing the log =============================================
+    def read(self):
+        """Returns the list of changes logged for the current snapshot. (A
+        partly written last line, from an interrupted save, is dropped.)"""
+        if not os.path.exists(self.fpath): return []
+        snapshot = self.file_hash(self.fpath)
+        # After an interrupted compaction the matching log may be the
+        # temporary one - if so, finish putting it in place.
+        for path in [self.logpath + ".tmp", self.logpath]:
+            if not os.path.exists(path): continue
+            with open(path, 'r', encoding='utf-8') as fobj:
+                lines = fobj.read().split("\n")
+            try: header = json.loads(lines[0])
+            except ValueError: continue
+            if header.get('snapshot') != snapshot: continue
+            if path != self.logpath: os.replace(path, self.logpath)
+            ops = []
+            for line in lines[1:]:
+                try: ops.append(json.loads(line))
+                except ValueError: break
+            # Rewrite the log without a broken last line, to append after
+            if len(ops) < len([line for line in lines[1:] if line]):
+                self.start_log(self.logpath, snapshot, ops)
+            self.nlogged = len(ops)
+            return ops
+        return []
+    def append(self):
+        """Appends the pending changes to the log (starting a new log if
+        there is none for the current snapshot)."""
+        with self.lock:
+            if not self.pending: return
+            if not os.path.exists(self.logpath): self.start_log()
+            with open(self.logpath, 'a', encoding='utf-8') as fobj:
+                for op in self.pending: fobj.write(json.dumps(op) + "\n")
+                fobj.flush(); os.fsync(fobj.fileno())
+            self.nlogged += len(self.pending); self.pending = []
+    def start_log(self, path=None, snapshot=None, ops=()):
+        """Writes a new log for the current snapshot (or the given hash)."""
+        path = path or self.logpath
+        snapshot = snapshot or self.file_hash(self.fpath)
+        with open(path, 'w', encoding='utf-8') as fobj:
+            fobj.write(json.dumps({'snapshot':snapshot}) + "\n")
+            for op in ops: fobj.write(json.dumps(op) + "\n")
+            fobj.flush(); os.fsync(fobj.fileno())
+        if path == self.logpath: self.nlogged = len(ops)
+    def rewrite(self, data, write):
+        """Replaces the snapshot with (data) right away, starting over with an
+        empty log (a full save)."""
+        self.wait(); self.pending = []
+        self.compact(data, write, background=False)
+
+    # Compaction ==============================================================
+    def needs_compaction(self):
+        return self.nlogged >= self.compact_after and self.compacting is None
+    def compact(self, data, write, background=True):
+        """Replaces the snapshot with (data), the Collection's current state,
+        using the function write(data, fpath), and drops the logged changes it
+        includes. Changes logged while the snapshot is being written are
+        carried over to the new log."""
+        with self.lock: start = self.nlogged
+        def run():
+            write(data, self.tmppath)
+            snapshot = self.file_hash(self.tmppath)
+            with self.lock:
+                # Carry over the changes logged since the data was taken
+                ops = self.read_logged()[start:]
+                self.start_log(self.logpath + ".tmp", snapshot, ops)
+                os.replace(self.tmppath, self.fpath)
+                os.replace(self.logpath + ".tmp", self.logpath)
+                self.nlogged = len(ops)
+            self.compacting = None
+        if background:
+            self.compacting = threading.Thread(target=run, daemon=True)
+            self.compacting.start()
+        else: run()
+    def read_logged(self):
+        """Returns every change in the current log file, without checking its
+        snapshot. (Caller must hold the lock.)"""
+        if not os.path.exists(self.logpath): return []
+        with open(self.logpath, 'r', encoding='utf-8') as fobj:
+            lines = fobj.read().split("\n")[1:]
+        ops = []
+        for line in lines:
+            try: ops.append(json.loads(line))
+            except ValueError: break
+        return ops
+    def wait(self):
+        """Waits for any compaction in progress to finish."""
+        if self.compacting is not None: self.compacting.join()
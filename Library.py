@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:31:58 2026
+
+This module defines the Library object, which manages all of the Collections
+stored in a directory (by default 'Library/') and keeps a persistent index of
+their contents, so that cards can be found across Collections without loading
+each one. The index also keeps the Analytics of each Collection, so that
+those of the whole Library are added up without loading any.
+
+@author: Joe Raso
+"""
+
+import os, re, pickle, hashlib
+import numpy as np
+import pandas as pd
+from Collection import Collection
+from Analytics import Analytics
+
+def group_rows(values):
+    """Returns a dictionary from each distinct value of an array to the
+    positions at which it occurs."""
+    codes, uniques = pd.factorize(np.asarray(values))
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques)+1))
+    return {value:order[bounds[i]:bounds[i+1]]
+        for i, value in enumerate(uniques)}
+
+def name_tokens(name):
+    """Splits a card name into lowercase search tokens."""
+    return re.findall(r"[a-z0-9']+", name.lower())
+
+class Library:
+    """The Collections stored in a directory, with an inverted index from
+    card properties (name and name tokens, set, color, rarity and MV) to the
+    Collections and rows holding them. The index is saved alongside the
+    Collections and kept up to date incrementally: only files whose
+    modification time and content hash have changed are re-indexed."""
+    def __init__(self, directory="Library/", indexpath=None):
+        self.directory = directory
+        self.indexpath = indexpath or os.path.join(directory, ".index.pkl")
+        # Per file: modification time, size, content hash, index keys and
+        # (for aggregated Collections) the number of copies in each row
+        self.files = {}
+        # Index: (field, value) -> {file name: array of row positions}
+        self.index = {}
+        if os.path.exists(self.indexpath): self.load_index()
+        self.update()
+
+    # Index maintenance =======================================================
+    def update(self):
+        """Brings the index up to date with the directory, re-indexing only
+        new or changed Collection files. Files that can't be read are
+        reported and left out. Returns the re-indexed file names."""
+        found = {f for f in os.listdir(self.directory) if
+            os.path.splitext(f)[1].lower() in Collection.formats and
+            not os.path.splitext(f)[0].endswith(".tmp")}
+        changed = []
+        # Forget any files that no longer exist
+        for fname in set(self.files) - found: self.remove_file(fname)
+        for fname in sorted(found):
+            fpath = os.path.join(self.directory, fname)
+            stat = self.file_stat(fpath); entry = self.files.get(fname)
+            if entry and (entry['mtime'], entry['size']) == stat: continue
+            # (Other card managers' csv exports aren't Collections)
+            if Collection.is_export(fpath):
+                self.remove_file(fname); continue
+            # The modification time changed - but the contents may not have
+            digest = self.file_hash(fpath)
+            if entry and entry['hash'] == digest:
+                entry['mtime'] = stat[0]; continue
+            self.remove_file(fname)
+            try: self.index_file(fname, stat, digest)
+            except Exception as error:
+                print(f"Warning: {fname} could not be indexed --- "
+                    f"{type(error).__name__}: {error}")
+                continue
+            changed.append(fname)
+        self.save_index()
+        return changed
+    @staticmethod
+    def file_stat(fpath):
+        """Returns the (modification time, size) of a Collection file,
+        counting its journal (if it is journaled) as part of the file."""
+        stat = os.stat(fpath); mtime = stat.st_mtime; size = stat.st_size
+        if os.path.exists(fpath + ".journal"):
+            log = os.stat(fpath + ".journal")
+            mtime = max(mtime, log.st_mtime); size += log.st_size
+        return (mtime, size)
+    @staticmethod
+    def file_hash(fpath):
+        """Returns the (sha1) hash of a file's contents (and its journal's,
+        if it is journaled)."""
+        digest = hashlib.sha1()
+        for path in [fpath, fpath + ".journal"]:
+            if not os.path.exists(path): continue
+            with open(path, 'rb') as fobj:
+                for block in iter(lambda: fobj.read(2**20), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+    def index_file(self, fname, stat, digest):
+        """Adds the cards of a Collection file to the index."""
+        cards = Collection.from_file(os.path.join(self.directory, fname))
+        postings = {}
+        names = group_rows(cards['Name'].str.lower().to_numpy())
+        for name, rows in names.items():
+            postings[('name', name)] = rows
+            # Name tokens point to the rows of every name containing them
+            for token in set(name_tokens(name)):
+                postings.setdefault(('token', token), []).append(rows)
+        for key, rows in postings.items():
+            if isinstance(rows, list): postings[key] = np.sort(
+                np.concatenate(rows))
+        for column in ['Set', 'Color', 'Rarity', 'MV']:
+            for value, rows in group_rows(cards[column].astype(
+                    str).to_numpy()).items():
+                postings[(column.lower(), value)] = rows
+        entry = {'mtime':stat[0], 'size':stat[1], 'hash':digest,
+            'keys':list(postings), 'ncards':cards.card_count(),
+            'analytics':cards.analytics(),
+            'qty':cards['Qty'].to_numpy() if cards.aggregated else None}
+        # (Nothing is added to the index until the file has been read)
+        for key, rows in postings.items():
+            self.index.setdefault(key, {})[fname] = rows
+        self.files[fname] = entry
+    def remove_file(self, fname):
+        """Removes a Collection file from the index."""
+        entry = self.files.pop(fname, None)
+        if entry is None: return
+        for key in entry['keys']:
+            self.index[key].pop(fname, None)
+            if not self.index[key]: del self.index[key]
+
+    # Save/load functionality =================================================
+    def save_index(self):
+        """Saves the index to the Library's index file."""
+        with open(self.indexpath, 'wb') as fobj:
+            pickle.dump({'files':self.files, 'index':self.index}, fobj)
+    def load_index(self):
+        """Loads a previously saved index (starting over if it is
+        unreadable)."""
+        try:
+            with open(self.indexpath, 'rb') as fobj: saved = pickle.load(fobj)
+            self.files = saved['files']; self.index = saved['index']
+        except Exception: self.files = {}; self.index = {}
+    def collections(self):
+        """Returns the names of the Collection files in the Library."""
+        return sorted(self.files)
+    def load(self, fname):
+        """Loads one of the Library's Collections."""
+        return Collection.from_file(os.path.join(self.directory, fname))
+
+    # Searching ===============================================================
+    def holding(self, name):
+        """Returns a dictionary of the Collections holding any copy of the
+        card with the given (exact) name, and the number of copies in each."""
+        hits = self.index.get(('name', name.lower()), {})
+        return {fname:self.copies(fname, rows) for fname, rows in
+            hits.items()}
+    def copies(self, fname, rows):
+        """Returns the number of copies held in the given rows of one of the
+        Library's Collections (aggregated ones hold several per row)."""
+        qty = self.files[fname]['qty']
+        return len(rows) if qty is None else int(qty[rows].sum())
+    def find(self, name=None, text=None, set=None, color=None, rarity=None,
+             mv=None):
+        """Returns a dictionary from Collection file names to the row
+        positions of the cards matching all of the given criteria: an exact
+        name, words in the name (text), set code, color string, rarity code
+        and/or mana value. (Rows of aggregated Collections may hold several
+        copies - see copies().)"""
+        keys = []
+        if name is not None: keys.append(('name', name.lower()))
+        if text is not None:
+            keys += [('token', token) for token in name_tokens(text)]
+        for field, value in [('set', set), ('color', color),
+                ('rarity', rarity), ('mv', mv)]:
+            if value is None: continue
+            if field in ('set', 'rarity'): value = str(value).upper()
+            keys.append((field, str(value)))
+        if not keys: return {}
+        # Intersect the postings, starting from the smallest
+        postings = sorted((self.index.get(key, {}) for key in keys), key=len)
+        results = dict(postings[0])
+        for other in postings[1:]:
+            results = {fname:np.intersect1d(rows, other[fname],
+                assume_unique=True) for fname, rows in results.items()
+                if fname in other}
+        return {fname:rows for fname, rows in results.items() if len(rows)}
+    def analytics(self, fnames=None):
+        """Returns the Analytics (see Analytics.py) of all the Library's
+        Collections together, or of those named, from the index."""
+        fnames = self.collections() if fnames is None else fnames
+        return Analytics.combine(self.files[f]['analytics'] for f in fnames)
+    def cards(self, **criteria):
+        """Returns a Collection of every card in the Library matching the
+        criteria of find(), loading only the Collections that hold them. If
+        any of them is aggregated, so are the results (with a quantity for
+        every card)."""
+        parts = []
+        for fname, rows in self.find(**criteria).items():
+            parts.append(self.load(fname).iloc[rows])
+        results = Collection(pd.concat(parts, ignore_index=True)) if parts \
+            else Collection()
+        results.name = "Library Search"
+        return results
+
+if __name__ == '__main__':
+
+    library = Library()
+    print(library.holding("Duress"))
+    test = library.cards(text="oracle")
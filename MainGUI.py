@@ -3,24 +3,128 @@
 Created on Fri Oct  8 17:56:24 2021
 
 This module contains the main GUI interface --- the model and view objects for
-collections as well as the main window.
+collections as well as the main window. The window is shown before the
+Collection module (and pandas) is loaded, which is then imported in the
+background; QtSvg, the search bar and the icon and mana symbol images are
+likewise only loaded when first needed.
 
 @author: Joe Raso
 """
 
-from Collection import Collection
-from PyQt5 import QtWidgets, QtCore, QtGui, QtSvg
+import os, time
+STARTED = time.perf_counter() # (see 'gui.startup' in __main__)
+import threading, importlib
+from collections import OrderedDict, deque
+import numpy as np
+from Jobs import SearchJob, LoadJob, SaveJob
+from Metrics import Metrics
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+class ManaSymbols:
+    """Process-wide cache of mana cost images. Each symbol is rasterized from
+    its svg file (in images/mana-symbols/) once per size, and the composed
+    images of whole mana costs are kept in a least-recently-used cache keyed
+    by the cost string. Hit/miss counts are kept for both."""
+    directory = 'images/mana-symbols/'
+    available = None # names of the symbol files, found on first use
+    symbols = {} # (symbol, size) -> QImage
+    costs = OrderedDict() # (cost string, size) -> QImage
+    maxcosts = 4096
+    counts = {'symbol_hits':0, 'symbol_misses':0, 'cost_hits':0,
+        'cost_misses':0}
+    @classmethod
+    def symbol_image(cls, sym, size):
+        """Returns the rasterized image of a single mana symbol."""
+        key = (sym, size)
+        if key in cls.symbols:
+            cls.counts['symbol_hits'] += 1
+            return cls.symbols[key]
+        cls.counts['symbol_misses'] += 1
+        if cls.available is None:
+            cls.available = {os.path.splitext(f)[0] for f in
+                os.listdir(cls.directory) if f.endswith('.svg')}
+        image = QtGui.QImage(size, size, QtGui.QImage.Format_ARGB32)
+        image.fill(0) # Fills in a transparent background
+        if sym in cls.available:
+            from PyQt5 import QtSvg
+            painter = QtGui.QPainter(image)
+            renderer = QtSvg.QSvgRenderer(f'{cls.directory}{sym}.svg')
+            renderer.render(painter, QtCore.QRectF(0, 0, size, size))
+            painter.end()
+        cls.symbols[key] = image
+        return image
+    @classmethod
+    def cost_image(cls, cost_string, size=15):
+        """Returns a QImage of a mana cost string (e.g. '{2}{G}{G}')."""
+        key = (cost_string, size)
+        if key in cls.costs:
+            cls.counts['cost_hits'] += 1
+            cls.costs.move_to_end(key)
+            return cls.costs[key]
+        cls.counts['cost_misses'] += 1
+        # Parsing the mana cost string into a list of symbol names
+        parsed = cost_string.replace(' // ','{slash}')
+        parsed = parsed.replace('/','') # for hybrid/phyrex. mana
+        symbols = parsed[1:-1].split('}{')
+        # Generate the cost image and painter object
+        imgformat = QtGui.QImage.Format_ARGB32
+        image = QtGui.QImage(size*len(symbols), size, imgformat)
+        image.fill(0) # Fills in a white background
+        painter = QtGui.QPainter(image); loc=0
+        # Retrieve and set the font (for inserting slashes)
+        f = painter.font(); f.setPixelSize(size); painter.setFont(f)
+        # Add the (cached) symbol images to the cost image
+        for sym in symbols:
+            area = QtCore.QRectF(loc, 0, size, size)
+            if sym == 'slash':
+                painter.drawText(area, QtCore.Qt.AlignCenter, '//')
+            elif sym == '':
+                continue
+            else:
+                painter.drawImage(loc, 0, cls.symbol_image(sym, size))
+            loc += size
+        painter.end()
+        cls.costs[key] = image
+        if len(cls.costs) > cls.maxcosts: cls.costs.popitem(last=False)
+        return image
+    @classmethod
+    def stats(cls):
+        """Returns the cache counts along with the hit rate of each cache."""
+        stats = dict(cls.counts)
+        for cache in ['symbol', 'cost']:
+            total = stats[f'{cache}_hits'] + stats[f'{cache}_misses']
+            stats[f'{cache}_hit_rate'] = (stats[f'{cache}_hits']/total
+                if total else 0.0)
+        return stats
+Metrics.register_cache('mana_symbols', ManaSymbols.stats)
+        
 
 class CollectionModel(QtCore.QAbstractTableModel):
-    """The model for GUI interface with a collection object."""
+    """The model for GUI interface with a collection object. Cells are served
+    from a snapshot of the collection's columns (as arrays of display
+    values), and rows are handed to the view in batches as it scrolls
+    (fetchMore), so that large collections stay responsive. Changes made
+    through the model are signalled for just the rows they affect. While a
+    filter is set (see setFilter()), only the matching rows are shown."""
+    # Number of rows handed to the view at a time
+    batchsize = 1000
     def __init__(self, collection, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.collection = collection
         # Auto-find the index of columns the model needs to treat specially
         self.selectioncolumn = self.collection.columns.get_loc('Sel')
         self.manacolumn = self.collection.columns.get_loc('Cost')
+        self.datecolumn = self.collection.columns.get_loc('Released')
         # Keep a master list of the editable columns
         self.editable = [self.selectioncolumn]
+        # Build the snapshot and load the first batch of rows
+        self.cells = self.snapshot(self.collection)
+        self.loaded = min(len(self.collection), self.batchsize)
+        self.fetching = False
+        # The filter query, and the collection rows it shows (None when the
+        # whole collection is shown)
+        self.query = ""
+        self.rows = None
         
     # Mandatory reimplementations for a table model ===========================
     def data(self, index, role):
@@ -31,21 +135,22 @@ class CollectionModel(QtCore.QAbstractTableModel):
         # The selection column has a checked state, no display role
         elif index.column()==self.selectioncolumn:
             if role==QtCore.Qt.CheckStateRole:
-                if self.collection.iloc[index.row(), index.column()]:
+                if self.cell(index):
                     return QtCore.Qt.Checked
                 else: return QtCore.Qt.Unchecked
         # For all other columns, default to collection content as display role
         elif role==QtCore.Qt.DisplayRole:
-            return str(self.collection.iloc[index.row(), index.column()])   
+            return self.cell(index)
         # Sel, Name and cost should align left, all others should align center
         elif role==QtCore.Qt.TextAlignmentRole:
             if index.column() <= 2:
                 return QtCore.Qt.AlignLeft
             else: return QtCore.Qt.AlignCenter
-    def rowCount(self, index):
-        return len(self.collection)
-    def columnCount(self, index):
-        return len(self.collection.columns)
+    def rowCount(self, index=QtCore.QModelIndex()):
+        # Cells have no children (this is a flat table)
+        return 0 if index.isValid() else self.loaded
+    def columnCount(self, index=QtCore.QModelIndex()):
+        return 0 if index.isValid() else len(self.collection.columns)
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
         # Display the column names in the horizontal header
         if orientation == QtCore.Qt.Horizontal:
@@ -55,6 +160,20 @@ class CollectionModel(QtCore.QAbstractTableModel):
             elif role == QtCore.Qt.DisplayRole:
                 return self.collection.columns[section]
         # Note: no vertical header - it's ugly
+    
+    # Incremental loading =====================================================
+    def canFetchMore(self, index=QtCore.QModelIndex()):
+        return not index.isValid() and self.loaded < self.total()
+    def fetchMore(self, index=QtCore.QModelIndex()):
+        count = min(self.batchsize, self.total() - self.loaded)
+        # Views may ask for more rows while being told of the last batch
+        if count <= 0 or self.fetching: return
+        self.fetching = True
+        self.beginInsertRows(QtCore.QModelIndex(), self.loaded,
+            self.loaded+count-1)
+        self.loaded += count
+        self.endInsertRows()
+        self.fetching = False
         
     # Mandatory reimplementations for an editable table =======================
     def flags(self, index):
@@ -66,10 +185,11 @@ class CollectionModel(QtCore.QAbstractTableModel):
     def setData(self, index, value, role):
         # Define how values are translated to bool for the selection column
         if index.column() == self.selectioncolumn:
-            if value==0:
-                self.collection.iloc[index.row(),index.column()] = False
-            else: self.collection.iloc[index.row(),index.column()] = True
-            self.layoutChanged.emit()
+            selected = (value != 0)
+            row = self.row(index.row())
+            self.collection.iloc[row,index.column()] = selected
+            self.cells[index.column()][row] = selected
+            self.dataChanged.emit(index, index, [role])
             return True
         return False
             
@@ -77,37 +197,130 @@ class CollectionModel(QtCore.QAbstractTableModel):
     def sort(self, column, order):
         ascending = True if order==QtCore.Qt.AscendingOrder else False
         column_name = self.collection.columns[column]
-        self.collection.sort_by(column_name, ascending=ascending)  
-        self.layoutChanged.emit()        
+        with Metrics.timer('gui.sort'), Metrics.profile('sort'):
+            self.layoutAboutToBeChanged.emit()
+            self.collection.sort_by(column_name, ascending=ascending)  
+            self.cells = self.snapshot(self.collection)
+            # (The same cards match the filter, at their new positions)
+            if self.rows is not None: self.rows = np.flatnonzero(
+                self.collection.filter_mask(self.query))
+            self.layoutChanged.emit()        
             
     # Nonstandard functions ===================================================
+    def row(self, row):
+        """Returns the collection row shown at a row of the model."""
+        return row if self.rows is None else self.rows[row]
+    def cell(self, index):
+        """Returns the snapshot value of the cell at a model index."""
+        return self.cells[index.column()][self.row(index.row())]
+    def total(self):
+        """Returns the number of rows shown once all are loaded."""
+        return len(self.collection) if self.rows is None else len(self.rows)
+    def setFilter(self, query):
+        """Shows only the cards matching a filter query (see Filter.py), or
+        the whole collection for an empty query."""
+        self.beginResetModel()
+        self.query = query.strip()
+        self.rows = np.flatnonzero(self.collection.filter_mask(
+            self.query)) if self.query else None
+        self.loaded = min(self.total(), self.batchsize)
+        self.endResetModel()
+    @staticmethod
+    def snapshot(collection):
+        """Returns a list (by column) of arrays holding the display value of
+        every cell in a collection (or the selection status, for 'Sel')."""
+        cells = []
+        for column in collection.columns:
+            values = collection[column]
+            if column == 'Sel':
+                cells.append(values.to_numpy(dtype=bool, copy=True))
+            # Dates are displayed without the time (blank if unknown)
+            elif column in ('Released', 'Refreshed'):
+                cells.append(values.dt.strftime('%Y-%m-%d').fillna(
+                    "").to_numpy(dtype=object))
+            # Prices are in dollars and cents (blank if unknown)
+            elif column == 'Price':
+                cells.append(values.map('{:.2f}'.format).where(
+                    values.notna(), "").to_numpy(dtype=object))
+            else: cells.append(values.astype(str).to_numpy(dtype=object))
+        return cells
+    def addCards(self, *collections):
+        """Adds cards from other Collections to the end of the model's
+        collection, signalling the inserted rows to any views (rather than
+        resetting the whole layout)."""
+        count = sum(len(c) for c in collections)
+        if count == 0: return
+        # Adding to an aggregated collection also changes the quantities of
+        # existing rows (and added cards may or may not match a filter, or
+        # bring optional columns such as 'Price' along), so the model is
+        # simply reset. (Aggregated cards are expanded, adding no 'Qty'.)
+        extra = set().union(*(c.columns for c in collections)) - \
+            set(self.collection.columns) - {'Qty'}
+        if self.collection.aggregated or self.rows is not None or extra:
+            self.beginResetModel()
+            self.collection.add_cards(*collections)
+            self.cells = self.snapshot(self.collection)
+            if self.rows is not None: self.rows = np.flatnonzero(
+                self.collection.filter_mask(self.query))
+            self.loaded = min(self.total(), max(self.loaded,
+                self.batchsize))
+            self.endResetModel()
+            return
+        first = len(self.collection)
+        # Rows past the loaded batches will be fetched as the view scrolls,
+        # so only signal the ones that will be loaded right away.
+        signal = (self.loaded == first) and not self.fetching
+        if signal:
+            last = min(first+count, first+self.batchsize) - 1
+            self.fetching = True
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        self.collection.add_cards(*collections)
+        # Extend the snapshot with just the new rows
+        new = self.snapshot(self.collection.iloc[first:])
+        self.cells = [np.concatenate([old, add]) for old, add in
+            zip(self.cells, new)]
+        if signal:
+            self.loaded = last + 1
+            self.endInsertRows()
+            self.fetching = False
+    def dropSelected(self):
+        """Drops the selected cards from the model's collection, signalling
+        the removed rows to any views."""
+        dropped = self.collection.drop_selected()
+        if len(dropped) == 0: return
+        # Group the dropped rows into runs of consecutive rows
+        breaks = np.flatnonzero(np.diff(dropped) != 1) + 1
+        runs = [(int(run[0]), int(run[-1])) for run in
+            np.split(dropped, breaks)]
+        keep = np.ones(len(self.cells[0]), dtype=bool); keep[dropped] = False
+        # Many scattered runs are cheaper to handle with a single reset (as
+        # are the rows of a filtered view)
+        if len(runs) > 50 or self.rows is not None:
+            self.beginResetModel()
+            self.cells = [cells[keep] for cells in self.cells]
+            if self.rows is not None: self.rows = np.flatnonzero(
+                self.collection.filter_mask(self.query))
+            self.loaded = min(self.loaded, self.total())
+            self.endResetModel()
+            return
+        # Otherwise remove the runs from last to first (signalling only the
+        # rows that have been loaded into the view)
+        self.fetching = True
+        for first, last in reversed(runs):
+            visible = min(last, self.loaded-1)
+            if first <= visible:
+                self.beginRemoveRows(QtCore.QModelIndex(), first, visible)
+            self.cells = [np.delete(c, np.s_[first:last+1])
+                for c in self.cells]
+            if first <= visible:
+                self.loaded -= visible - first + 1
+                self.endRemoveRows()
+        self.fetching = False
     def parseManaCost(self, index, symbol_size=15):
         """Retrieves the mana cost from the card at (index) and returns a
         QImage of the cost to display."""
-        # Retriving and parsing the mana cost string into a list of filenames
-        cost_string = self.collection.iloc[index.row(), self.manacolumn]
-        cost_string = cost_string.replace(' // ','{slash}')
-        cost_string = cost_string.replace('/','') # for hybrid/phyrex. mana
-        symbols = cost_string[1:-1].split('}{')
-        # Generate the cost image and painter object
-        imgformat = QtGui.QImage.Format_ARGB32
-        image = QtGui.QImage(symbol_size*len(symbols), symbol_size, imgformat)
-        image.fill(0) # Fills in a white background
-        painter = QtGui.QPainter(image); loc=0
-        # Retrieve and set the font (for inserting slashes)
-        f = painter.font(); f.setPixelSize(symbol_size); painter.setFont(f)
-        # render symbols from their individual files and add them to the image
-        for sym in symbols:
-            area = QtCore.QRectF(loc, 0, symbol_size, symbol_size)
-            if sym == 'slash':
-                painter.drawText(area, QtCore.Qt.AlignCenter, '//')
-            elif sym == '':
-                continue
-            else:
-                renderer = QtSvg.QSvgRenderer(f'images/mana-symbols/{sym}.svg')
-                renderer.render(painter, area)
-            loc += symbol_size
-        return image
+        cost_string = self.cells[self.manacolumn][self.row(index.row())]
+        return ManaSymbols.cost_image(cost_string, symbol_size)
         
         
 class CollectionView(QtWidgets.QTableView):
@@ -133,12 +346,29 @@ class CollectionView(QtWidgets.QTableView):
         self.setSortingEnabled(True)
         # Connect the on-click functionality
         self.clicked.connect(self.onClick)
+        # Keep the paint times (in seconds) of the most recent frames
+        self.paintTimes = deque(maxlen=200)
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paintTimes.append(time.perf_counter() - start)
+        Metrics.observe('gui.paint', self.paintTimes[-1])
+    def paintStats(self):
+        """Returns the number of recently painted frames, their average and
+        maximum paint times (in milliseconds) and the mana cost cache
+        statistics."""
+        times = list(self.paintTimes)
+        stats = {'frames':len(times),
+            'mean_ms':1000*sum(times)/len(times) if times else 0.0,
+            'max_ms':1000*max(times) if times else 0.0}
+        stats.update(ManaSymbols.stats())
+        return stats
     def onClick(self):
         """Defines what happens when the table is clicked."""
         index = self.selectionModel().currentIndex()
         # if the index is the selection column, toggle it's value
         if index.column() == self.model().selectioncolumn:
-            if self.model().collection.iloc[index.row(), index.column()]:
+            if self.model().cell(index):
                 self.model().setData(index, 0, QtCore.Qt.CheckStateRole)
             else: self.model().setData(index, 1, QtCore.Qt.CheckStateRole)
             
@@ -158,10 +388,20 @@ class MainWindow(QtWidgets.QMainWindow):
         self.tabs.tabCloseRequested.connect(self.closeTab)
         self.tabs.tabBarDoubleClicked.connect(self.renameTab)
         self.setCentralWidget(self.tabs)
-        # Add the top tool bar and search bar.
-        self.generateToolBar(); self.generateSearchBar()
+        # Add the top tool bar (the search bar is generated when first shown)
+        self.generateToolBar(); self.searchbar = None
+        # Searches and file I/O are run as background jobs, with their
+        # progress shown in the status bar.
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.jobs = []
+        self.generateStatusBar()
     
     # Multi-use functionalities ===============================================
+    def preload(self):
+        """Imports the Collection module (and with it pandas) in a background
+        thread, so that it is ready by the time the first tab is opened."""
+        threading.Thread(target=importlib.import_module, args=('Collection',),
+            daemon=True).start()
     def getIcon(self, actionText):
         """Returns the icon associated with a given action text."""
         icons = {"Open":'folder-open-line', "New":'file-line',
@@ -178,8 +418,8 @@ class MainWindow(QtWidgets.QMainWindow):
         # Add button items for New/Open/Scryfall
         self.toolbar.addAction(self.getIcon("New"), "New", self.newTab)
         self.toolbar.addAction(self.getIcon("Open"), "Open", self.openTab)
-        self.toolbar.addAction(self.getIcon("Scryfall"), "Scryfall", lambda:
-            self.searchbar.setHidden(False))
+        self.toolbar.addAction(self.getIcon("Scryfall"), "Scryfall",
+            self.showSearchBar)
         # Add a dropdown tool button to save/save as
         saveMenu = QtWidgets.QMenu("Save")
         saveMenu.addAction("Save", self.saveTab)
@@ -202,6 +442,20 @@ class MainWindow(QtWidgets.QMainWindow):
         self.movetoMenu.aboutToShow.connect(self.generateMoveToMenu)
         self.movetoMenu.menuAction().setIcon(self.getIcon("Move To"))
         self.toolbar.addAction(self.movetoMenu.menuAction())
+        # Add a dropdown menu for comparing with other tabs
+        self.compareMenu = QtWidgets.QMenu("Compare")
+        self.compareMenu.aboutToShow.connect(self.generateCompareMenu)
+        self.toolbar.addAction(self.compareMenu.menuAction())
+        # Add a field filtering the current tab's cards as the query is typed
+        self.toolbar.addSeparator()
+        self.filterfield = QtWidgets.QLineEdit()
+        self.filterfield.setPlaceholderText("Filter (e.g. bolt s:m10 c:r)")
+        self.filterfield.setClearButtonEnabled(True)
+        self.filterfield.setMaximumWidth(250)
+        self.filterfield.textChanged.connect(self.filterTab)
+        self.toolbar.addWidget(self.filterfield)
+        # Each tab keeps its own filter
+        self.tabs.currentChanged.connect(self.showTabFilter)
         # Add the toolbar to the main window
         self.addToolBar(self.toolbar)
     def generateSearchBar(self):
@@ -225,16 +479,99 @@ class MainWindow(QtWidgets.QMainWindow):
         self.searchbar.setHidden(True)
         # Add the seachbar to the main window
         self.addDockWidget(QtCore.Qt.TopDockWidgetArea, self.searchbar)
+    def showSearchBar(self):
+        """Shows the search bar, generating it on first use."""
+        if self.searchbar is None: self.generateSearchBar()
+        self.searchbar.setHidden(False)
+        self.searchfield.setFocus()
+    
+    def generateStatusBar(self):
+        """Initializes the status bar at the bottom of the window, with a
+        button to cancel any running jobs."""
+        self.cancelbutton = QtWidgets.QPushButton("Cancel")
+        self.cancelbutton.clicked.connect(self.cancelJobs)
+        self.cancelbutton.setHidden(True)
+        self.statusBar().addPermanentWidget(self.cancelbutton)
+        # Toggles the metrics panel (and the collection of metrics)
+        self.metricsbutton = QtWidgets.QPushButton("Metrics")
+        self.metricsbutton.setCheckable(True)
+        self.metricsbutton.toggled.connect(self.showMetrics)
+        self.statusBar().addPermanentWidget(self.metricsbutton)
+        self.metricspanel = None
+    def showMetrics(self, show):
+        """Shows or hides the metrics panel, a dock widget listing the
+        timings, counts and cache hit rates recorded so far (refreshed every
+        second). Metrics are only collected while it is shown, unless they
+        were enabled at startup."""
+        if self.metricspanel is None:
+            self.metricspanel = QtWidgets.QDockWidget("Metrics")
+            # (Closed through the status bar button only)
+            self.metricspanel.setFeatures(
+                QtWidgets.QDockWidget.DockWidgetMovable |
+                QtWidgets.QDockWidget.DockWidgetFloatable)
+            text = QtWidgets.QPlainTextEdit(); text.setReadOnly(True)
+            text.setFont(QtGui.QFontDatabase.systemFont(
+                QtGui.QFontDatabase.FixedFont))
+            self.metricspanel.setWidget(text)
+            self.addDockWidget(QtCore.Qt.BottomDockWidgetArea,
+                self.metricspanel)
+            self.metricstimer = QtCore.QTimer(self)
+            self.metricstimer.timeout.connect(lambda:
+                text.setPlainText(Metrics.summary()))
+            self.metricsenv = Metrics.enabled
+        if show:
+            Metrics.enable(); self.metricstimer.start(1000)
+            self.metricspanel.widget().setPlainText(Metrics.summary())
+        else:
+            self.metricstimer.stop(); Metrics.enable(self.metricsenv)
+        self.metricspanel.setVisible(show)
+    
+    # Background jobs =========================================================
+    def startJob(self, job, view=None):
+        """Starts a background job, showing its progress in the status bar.
+        If a view is given, the job is tied to its tab (and cancelled if the
+        tab is closed)."""
+        if view is not None: view.job = job
+        self.jobs.append(job)
+        job.signals.progress.connect(lambda steps, cards, message:
+            self.statusBar().showMessage(message))
+        job.signals.failed.connect(lambda message:
+            self.statusBar().showMessage(message))
+        job.signals.failed.connect(lambda message: self.finishJob(job))
+        job.signals.finished.connect(lambda result: self.finishJob(job))
+        self.statusBar().showMessage(job.description + "...")
+        self.cancelbutton.setHidden(False)
+        self.pool.start(job)
+    def finishJob(self, job):
+        """Forgets a job that has finished (or failed)."""
+        if job in self.jobs: self.jobs.remove(job)
+        if not self.jobs: self.cancelbutton.setHidden(True)
+    def cancelJobs(self):
+        """Cancels every running job."""
+        for job in self.jobs: job.cancel()
+        self.statusBar().showMessage("Cancelled", 2000)
     
     # Tab/file manipulation functions =========================================
     def openSearch(self):
-        """Opens a new collection tab containing search results."""
-        view = CollectionView(Collection.from_search(self.searchfield.text()))
-        self.tabs.addTab(view, view.model().collection.name)
+        """Opens a new collection tab containing search results. The tab is
+        opened right away, and filled in as each page of results arrives."""
+        from Collection import Collection
+        collection = Collection(); collection.name = "Search Results"
+        view = CollectionView(collection)
+        self.tabs.addTab(view, collection.name)
+        self.tabs.setCurrentWidget(view)
         self.searchbar.setHidden(True) # re-hide the search bar
+        # Run the search in the background, adding each page as it arrives
+        job = SearchJob(self.searchfield.text())
+        job.signals.chunk.connect(view.model().addCards)
+        job.signals.finished.connect(lambda ncards: ncards is None or
+            self.statusBar().showMessage(f"{job.description}: {ncards} "
+                "cards found", 5000))
+        self.startJob(job, view)
     def newTab(self):
         """Opens a blank collection tab."""
         # Must initialize a blank collection to pass to the model/view
+        from Collection import Collection
         view = CollectionView(Collection())
         self.tabs.addTab(view, view.model().collection.name)
     def openTab(self):
@@ -242,12 +579,48 @@ class MainWindow(QtWidgets.QMainWindow):
         fpath_tuple = QtWidgets.QFileDialog.getOpenFileName(
             directory='Library/')
         if fpath_tuple[0]:
-            collection = Collection.from_file(fpath_tuple[0])
-            view = CollectionView(collection)
-            self.tabs.addTab(view, collection.name)
+            # Load the file in the background, opening the tab when done
+            job = LoadJob(fpath_tuple[0])
+            job.signals.finished.connect(lambda collection: collection is None
+                or self.addCollectionTab(collection))
+            self.startJob(job)
+    def addCollectionTab(self, collection):
+        """Opens a new tab for an already loaded collection."""
+        view = CollectionView(collection)
+        self.tabs.addTab(view, collection.name)
+        # (Comparison results and imported card lists have no file path)
+        self.statusBar().showMessage("Opened "
+            f"{collection.fpath or collection.name}", 5000)
+    def filterTab(self, query):
+        """Filters the current tab's cards by a query (see Filter.py)."""
+        view = self.tabs.currentWidget()
+        if view is None: return
+        with Metrics.timer('gui.filter'): view.model().setFilter(query)
+    def showTabFilter(self, currentIndex):
+        """Shows the filter of the newly selected tab in the filter field."""
+        view = self.tabs.widget(currentIndex)
+        self.filterfield.blockSignals(True)
+        self.filterfield.setText(view.model().query if view else "")
+        self.filterfield.blockSignals(False)
     def closeTab(self, currentIndex):
-        """Closes a tab."""
+        """Closes a tab (cancelling any job still filling it)."""
+        job = getattr(self.tabs.widget(currentIndex), 'job', None)
+        if job is not None: job.cancel()
         self.tabs.removeTab(currentIndex)
+    def saveCollection(self, collection, fpath=None):
+        """Saves a collection in the background (to a new file path, if
+        given)."""
+        # A journaled collection only appends its changes, so is saved here
+        # (any compaction it needs runs in the background by itself)
+        if collection.journal is not None and not fpath:
+            collection.save()
+            self.statusBar().showMessage(f"Saved {collection.fpath}", 5000)
+            return
+        if fpath: collection.set_fpath(fpath)
+        job = SaveJob(collection, collection.fpath)
+        job.signals.finished.connect(lambda fpath: fpath is None or
+            self.statusBar().showMessage(f"Saved {fpath}", 5000))
+        self.startJob(job)
     def saveTab(self):
         """Saves the currently selected collection to file if it has an
         associated file path, otherwise prompts 'Save As'."""
@@ -255,7 +628,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # Only do something if the focus is currently on a tab
         if thisTab > -1:
             collection = self.tabs.widget(thisTab).model().collection
-            if collection.fpath: collection.save()
+            if collection.fpath: self.saveCollection(collection)
             else: self.saveAsTab()
     def saveAsTab(self):
         """Saves the currently selected collection to file."""
@@ -267,7 +640,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 caption="Save As", directory=f"Library/{collection.name}.csv")
             # Proceed to saving if a filepath was specified
             if fpath_tuple[0]:
-                collection.save(fpath_tuple[0])
+                self.saveCollection(collection, fpath_tuple[0])
                 # Update the tab with the newly saved collection name
                 self.tabs.setTabText(thisTab, collection.name)
     def renameTab(self):
@@ -293,7 +666,7 @@ class MainWindow(QtWidgets.QMainWindow):
     def dropSelected(self):
         """Drops the selected cards from the current Collection."""
         mod = self.tabs.widget(self.tabs.currentIndex()).model()
-        mod.collection.drop_selected(); mod.layoutChanged.emit()
+        mod.dropSelected()
     def generateCopyToMenu(self):
         """Generates/regenerates the dropdown menu of currently open tabs to
         copy selected cards to."""
@@ -305,10 +678,9 @@ class MainWindow(QtWidgets.QMainWindow):
             dest = self.tabs.widget(destIndex).model()
             def copyto():
                 # Perform the copy to operation
-                cards = source.collection.copy_selected()
-                dest.collection.add_cards(cards)
-                # Update the view of both models
-                dest.layoutChanged.emit(); source.layoutChanged.emit()
+                with Metrics.timer('gui.copy'), Metrics.profile('copy'):
+                    cards = source.collection.copy_selected()
+                    dest.addCards(cards)
             return copyto
         def copyto_new():
             # Function that copies selected cards to a new tab
@@ -334,12 +706,11 @@ class MainWindow(QtWidgets.QMainWindow):
             dest = self.tabs.widget(destIndex).model()
             def moveto():
                 # Perform the move to operation
-                cards = source.collection.copy_selected()
-                dest.collection.add_cards(cards)
-                # The key difference between copy and move:
-                source.collection.drop_selected() 
-                # Update the view of both models
-                dest.layoutChanged.emit(); source.layoutChanged.emit()
+                with Metrics.timer('gui.move'), Metrics.profile('move'):
+                    cards = source.collection.copy_selected()
+                    dest.addCards(cards)
+                    # The key difference between copy and move:
+                    source.dropSelected()
             return moveto
         def moveto_new():
             # Function that moves selected cards to a new tab
@@ -352,14 +723,41 @@ class MainWindow(QtWidgets.QMainWindow):
         if sourceIndex >= 0:
             self.movetoMenu.addSeparator()
             self.movetoMenu.addAction("New", moveto_new)
+    def generateCompareMenu(self):
+        """Generates/regenerates the dropdown menu of currently open tabs to
+        compare the current collection with. Each comparison opens its
+        result (e.g. the cards still needed for a deck) in a new tab."""
+        self.compareMenu.clear() # Clear the current menu
+        sourceIndex = self.tabs.currentIndex()
+        def generate_compare(destIndex, operation):
+            # Generates a comparison function for each source/destination.
+            source = self.tabs.widget(sourceIndex).model().collection
+            other = self.tabs.widget(destIndex).model().collection
+            return lambda: self.addCollectionTab(operation(source, other))
+        for i in range(self.tabs.count()):
+            if i != sourceIndex:
+                tabname = self.tabs.widget(i).model().collection.name
+                submenu = self.compareMenu.addMenu(tabname)
+                submenu.addAction(f"Not in {tabname}", generate_compare(i,
+                    lambda source, other: source.subtract(other)))
+                submenu.addAction(f"Only in {tabname}", generate_compare(i,
+                    lambda source, other: other.subtract(source)))
+                submenu.addAction("In both", generate_compare(i,
+                    lambda source, other: source.intersect(other)))
+                submenu.addAction("Merged", generate_compare(i,
+                    lambda source, other: source.merge(other)))
         
         
 if __name__ == '__main__':
     
     app = QtWidgets.QApplication([])
     win = MainWindow()
-    win.show()
+    win.show(); app.processEvents()
+    Metrics.observe('gui.startup', time.perf_counter() - STARTED)
+    win.preload()
     app.exec()
+    # Keep the metrics of the session, if they were being collected
+    if Metrics.enabled: Metrics.dump()
     
     # After closing the window, grab a few handles for debugging
     view = win.tabs.widget(0)
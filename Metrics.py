@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 00:56:56 2026
+
+This module contains ScrollRack's built-in instrumentation: timers (with
+latency histograms), counters and cache hit rates for the work done behind
+the GUI (Scryfall requests, pandas work on Collections, repaints), and an
+opt-in cProfile hook for individual actions (search, open, sort, move...).
+Everything is off by default, and costs a single flag check per call while
+off. Turn it on with Metrics.enable(), or by setting the environment
+variable SCROLLRACK_METRICS=1 (and SCROLLRACK_PROFILE=search,sort,... to
+profile actions).
+
+@author: Joe Raso
+"""
+
+import os, time, json, bisect, threading, functools
+from itertools import count
+
+class NullTimer:
+    """The timer handed out while metrics are disabled - does nothing."""
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+class Timer:
+    """Times a block of code, recording it under a name on exit."""
+    def __init__(self, name): self.name = name
+    def __enter__(self):
+        self.start = time.perf_counter(); return self
+    def __exit__(self, *exc):
+        Metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """Process-wide store of timings, counters and cache statistics. Each
+    timing keeps its count, total and maximum, along with a histogram of
+    durations (in milliseconds, see buckets)."""
+    enabled = os.environ.get('SCROLLRACK_METRICS', '') not in ('', '0')
+    # Actions to run under cProfile (see profile())
+    profiled = {a for a in os.environ.get('SCROLLRACK_PROFILE',
+        '').split(',') if a}
+    profiledir = "Cache/profiles"
+    # Upper bounds of the histogram buckets (ms); the last is open-ended
+    buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+    timings = {} # name -> [count, total (s), max (s), bucket counts]
+    counters = {} # name -> count
+    caches = {} # name -> function returning a dict with hits/misses
+    lock = threading.Lock()
+    nulltimer = NullTimer()
+
+    # Switching on and off ====================================================
+    @classmethod
+    def enable(cls, enabled=True):
+        cls.enabled = enabled
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+    @classmethod
+    def reset(cls):
+        """Forgets all timings and counts recorded so far."""
+        with cls.lock: cls.timings.clear(); cls.counters.clear()
+
+    # Recording ===============================================================
+    @classmethod
+    def timer(cls, name):
+        """Returns a context manager timing its block under (name)."""
+        return Timer(name) if cls.enabled else cls.nulltimer
+    @classmethod
+    def observe(cls, name, seconds):
+        """Records a duration (in seconds) under (name)."""
+        if not cls.enabled: return
+        bucket = bisect.bisect_left(cls.buckets, seconds*1000)
+        with cls.lock:
+            entry = cls.timings.get(name)
+            if entry is None:
+                entry = cls.timings[name] = [0, 0.0, 0.0,
+                    [0]*(len(cls.buckets)+1)]
+            entry[0] += 1; entry[1] += seconds
+            entry[2] = max(entry[2], seconds); entry[3][bucket] += 1
+    @classmethod
+    def count(cls, name, n=1):
+        """Adds (n) to the counter (name)."""
+        if not cls.enabled: return
+        with cls.lock: cls.counters[name] = cls.counters.get(name, 0) + n
+    @classmethod
+    def register_cache(cls, name, stats):
+        """Registers a cache whose hit rate should be reported, by a function
+        returning its statistics (a dictionary including 'hits' and
+        'misses', or '<prefix>_hits' and '<prefix>_misses' pairs)."""
+        cls.caches[name] = stats
+
+    # Profiling ===============================================================
+    @classmethod
+    def profile(cls, action):
+        """Returns a context manager that runs its block under cProfile if
+        the action (e.g. 'search', 'open', 'sort', 'move') is being profiled
+        (see profiled), saving the profile to profiledir and printing its
+        most expensive calls. Only the calling thread is profiled."""
+        if action not in cls.profiled: return cls.nulltimer
+        return Profile(action, cls.profiledir)
+
+    # Reporting ===============================================================
+    @classmethod
+    def report(cls):
+        """Returns everything recorded so far as a (json-compatible)
+        dictionary."""
+        labels = [f"<{b}" for b in cls.buckets] + [f">={cls.buckets[-1]}"]
+        with cls.lock:
+            timers = {name:{'count':count, 'total_s':total,
+                'mean_ms':1000*total/count, 'max_ms':1000*peak,
+                'histogram_ms':{label:n for label, n in zip(labels, bins)
+                    if n}}
+                for name, (count, total, peak, bins) in cls.timings.items()}
+            counters = dict(cls.counters)
+        caches = {}
+        for name, stats in cls.caches.items():
+            try: caches[name] = cls.hit_rates(stats())
+            except Exception: continue
+        return {'enabled':cls.enabled, 'timers':timers, 'counters':counters,
+            'caches':caches}
+    @staticmethod
+    def hit_rates(stats):
+        """Adds hit rates to cache statistics, for each hits/misses pair."""
+        stats = dict(stats)
+        for key in [k for k in stats if k.endswith('hits')]:
+            misses = stats.get(key[:-4] + 'misses')
+            if misses is None: continue
+            total = stats[key] + misses
+            stats[key[:-4] + 'hit_rate'] = stats[key]/total if total else 0.0
+        return stats
+    @classmethod
+    def summary(cls):
+        """Returns the report as readable text."""
+        report = cls.report()
+        lines = [f"{'timer':<28}{'count':>8}{'mean ms':>10}{'max ms':>10}"
+            f"{'total s':>10}"]
+        for name, t in sorted(report['timers'].items()):
+            lines.append(f"{name:<28}{t['count']:>8}{t['mean_ms']:>10.2f}"
+                f"{t['max_ms']:>10.2f}{t['total_s']:>10.3f}")
+        for name, count in sorted(report['counters'].items()):
+            lines.append(f"{name:<28}{count:>8}")
+        for name, stats in sorted(report['caches'].items()):
+            rates = ", ".join(f"{k} {v:.0%}" for k, v in stats.items()
+                if k.endswith('hit_rate'))
+            lines.append(f"{name + ' cache':<28}{rates}")
+        return "\n".join(lines)
+    @classmethod
+    def dump(cls, fpath="Cache/metrics.json"):
+        """Writes the report to a json file."""
+        if os.path.dirname(fpath): os.makedirs(os.path.dirname(fpath),
+            exist_ok=True)
+        with open(fpath, 'w', encoding='utf-8') as fobj:
+            json.dump(cls.report(), fobj, indent=1)
+
+class Profile:
+    """Runs a block of code under cProfile (see Metrics.profile())."""
+    numbers = count(1) # numbers the profiles saved in a session
+    def __init__(self, action, directory):
+        self.action = action; self.directory = directory
+    def __enter__(self):
+        import cProfile # (imported only when profiling)
+        self.profiler = cProfile.Profile()
+        # (Only one profiler can run at a time on newer Pythons)
+        try: self.profiler.enable()
+        except ValueError: self.profiler = None
+        return self
+    def __exit__(self, *exc):
+        if self.profiler is None: return False
+        self.profiler.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        fpath = os.path.join(self.directory, f"{self.action}-"
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self.numbers)}.prof")
+        self.profiler.dump_stats(fpath)
+        print(f"Profile of '{self.action}' saved to {fpath}")
+        import pstats
+        pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(15)
+        return False
+
+def timed(name):
+    """Decorator recording the duration of each call under (name), while
+    metrics are enabled."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not Metrics.enabled: return function(*args, **kwargs)
+            start = time.perf_counter()
+            try: return function(*args, **kwargs)
+            finally: Metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
@@ -8,98 +8,215 @@ with Scryfall's API and pull card information from their online database.
 @author: Joe Raso
 """
 
-import json, time, requests
+import json, time, queue, threading, requests
 import pandas as pd
+from Cache import ResponseCache
+from Cards import RARITY_CODES, CANONICAL_COLORS, canonical_colors
+from Metrics import Metrics, timed
+
+class TokenBucket:
+    """A thread-safe token bucket rate limiter. Tokens refill continuously at
+    (rate) per second up to (capacity); each request takes one, and only has
+    to wait if the bucket is empty."""
+    def __init__(self, rate=10, capacity=1):
+        self.rate = rate; self.capacity = capacity
+        self.tokens = capacity; self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    def acquire(self):
+        """Takes a token, sleeping until one is available. Returns the time
+        spent waiting (in seconds)."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                self.tokens + (now - self.updated)*self.rate)
+            self.updated = now
+            # Reserve the token now (possibly going into debt) so that
+            # waiting threads are served in the order they arrived.
+            self.tokens -= 1
+            wait = -self.tokens/self.rate if self.tokens < 0 else 0
+        if wait > 0: time.sleep(wait)
+        return wait
 
 class ScryfallPortal:
     """Search engine that connects to the Scryfall API (https://scryfall.com/)
-    to retrieve card information and searches."""
-    def __init__(self):
-        self.searchpath = 'https://api.scryfall.com/cards/search'
+    to retrieve card information and searches. Responses are kept in an
+    on-disk ResponseCache (shared by default between all portals); pass
+    cache=False to always go to the server. The apipath keyword allows
+    pointing the portal at a local stand-in for the API."""
+    # The default cache is shared by every portal, and only opened when needed
+    shared_cache = None
+    # Scryfall's docs (https://scryfall.com/docs/api) request that a 50-100
+    # millisecond delay be inserted between requests sent to the server, so
+    # all portals (in all threads) draw from one limiter of 10 requests/sec.
+    limiter = TokenBucket(rate=10, capacity=1)
+    # A single keep-alive session is likewise shared to reuse connections.
+    session = None
+    session_lock = threading.Lock()
+    def __init__(self, cache=None, apipath='https://api.scryfall.com'):
+        self.apipath = apipath
+        self.searchpath = f'{apipath}/cards/search'
+        if cache is None: cache = self.default_cache()
+        self.cache = cache if cache else None
+    @classmethod
+    def default_cache(cls):
+        """Returns the ResponseCache shared by all portals, opening it on first
+        use."""
+        if cls.shared_cache is None:
+            cls.shared_cache = ResponseCache()
+            Metrics.register_cache('responses', cls.shared_cache.stats)
+        return cls.shared_cache
+    @classmethod
+    def get_session(cls):
+        """Returns the HTTP session shared by all portals, opening it on first
+        use."""
+        with cls.session_lock:
+            if cls.session is None:
+                cls.session = requests.Session()
+                cls.session.headers.update({'Accept':'application/json',
+                    'User-Agent':'ScrollRack'})
+        return cls.session
+    @timed('scryfall.format_result')
     def format_result(self, data):
         """Formats a the results of a Scryfall search (a json list of
-        dictionaries) into a Collection-compatible DataFrame."""
-        data = pd.DataFrame.from_dict(data)
-        # These columns need to exist in 'data' if they don't already
-        if 'colors' not in data.columns: data['colors'] = ''
-        if 'mana_cost' not in data.columns: data['mana_cost'] = ''
-        # Unpack neccessary characteristics for double-faced cards
-        if 'modal_dfc' in data.layout.unique():
-            subset = data[data.layout=='modal_dfc']
-            faces = pd.DataFrame(subset.card_faces.to_list(),
-                index=subset.index)
-            front = pd.json_normalize(faces.loc[:,0]).set_index(faces.index)
-            back = pd.json_normalize(faces.loc[:,1]).set_index(faces.index)
-            # Mana cost are given for both faces
-            subset.loc[:,'mana_cost'] = (front.loc[:,'mana_cost'] + ' // ' + 
-                back.loc[:,'mana_cost'])
-            # Set color by the front face only
-            subset.loc[:,'colors'] = front.loc[:,'colors']
-            data.update(subset)
-        if 'transform' in data.layout.unique():
-            subset = data[data.layout=='transform']
-            faces = pd.DataFrame(subset.card_faces.to_list(),
-                index=subset.index)
-            front = pd.json_normalize(faces.loc[:,0]).set_index(faces.index)
-            # Mana cost and color are for the front face only.
-            subset.loc[:,'mana_cost'] = front.loc[:,'mana_cost']
-            subset.loc[:,'colors'] = front.loc[:,'colors']
-            # These columns need to exist in 'data' if they don't already
-            if 'colors' not in data.columns: data['colors'] = ''
-            if 'mana_cost' not in data.columns: data['mana_cost'] = ''
-            data.update(subset)            
-        # Rename the columns expected by the collection object.
-        scrynames = {'name':'Name', 'mana_cost':'Cost', 'set':'Set',
-            'rarity':'Rarity', 'cmc':'MV', 'colors':'Color',
-            'released_at':'Released'}
-        data = data[list(scrynames.keys())].copy()
-        data.rename(columns=scrynames, inplace=True)
-        # Remap rarity column to one-letter codes
-        rarities = {'mythic':'M', 'rare':'R', 'uncommon':'U', 'common':'C'}
-        data.replace({'Rarity':rarities}, inplace=True)
-        # Set abbreviations should be capatalized
-        data['Set'] = data['Set'].apply(str.upper)
-        # Mana value should be an integer
-        data['MV'] = data['MV'].apply(int)
-        # Colors should be sorted and joined into a string
-        color_order = {'W':0, 'U':1, 'B':2, 'R':3, 'G':4}
-        def sort_join_colors(colors):
-            colors.sort(key=(lambda c: color_order[c]))
-            return "".join(colors)
-        data["Color"] = data['Color'].apply(sort_join_colors)
-        return data
-    def request(self, uri, **kwargs):
+        dictionaries) into a Collection-compatible DataFrame. Only the needed
+        fields are pulled from each card, in a single pass."""
+        costs = []; colors = []
+        for card in data:
+            cost = card.get('mana_cost'); color = card.get('colors')
+            # Multi-faced cards (transform, modal_dfc, reversible_card...) may
+            # only give these characteristics per face. (Split, flip and
+            # adventure cards have them at the top level already.)
+            if (cost is None or color is None) and 'card_faces' in card:
+                faces = card['card_faces']
+                if cost is None:
+                    # Mana costs are given for both faces of modal dfcs, but
+                    # only the front face of other cards.
+                    if card.get('layout') == 'modal_dfc':
+                        cost = ' // '.join(face.get('mana_cost', '')
+                            for face in faces)
+                    else: cost = faces[0].get('mana_cost', '')
+                # Color is set by the front face only
+                if color is None: color = faces[0].get('colors', [])
+            costs.append(cost or '')
+            # Colors are sorted and joined into a string by table lookup
+            joined = "".join(color or ())
+            colors.append(CANONICAL_COLORS.get(joined)
+                or canonical_colors(joined))
+        return pd.DataFrame({
+            'Name':[card['name'] for card in data],
+            'Cost':costs,
+            # Set abbreviations should be capatalized
+            'Set':[card['set'].upper() for card in data],
+            # Remap rarity column to one-letter codes
+            'Rarity':[RARITY_CODES.get(card['rarity'], card['rarity'])
+                for card in data],
+            # Mana value should be an integer
+            'MV':[int(card.get('cmc', 0)) for card in data],
+            'Color':colors,
+            'Released':[card['released_at'] for card in data]})
+    def request(self, uri, method='GET', cached=True, **kwargs):
         """Makes a request from Scryfall's API at the specified uri, and
         returns the results as a dictionary. Any keywords included here are
-        passed to requests.get()."""
-        # Scryfall's docs (https://scryfall.com/docs/api), request that a
-        # 50-100 millisecond delay be inserted between requests sent to the
-        # server. We add 200ms, 2x the requested amount just to be safe.
-        time.sleep(0.2)
-        req = requests.get(uri, **kwargs)
-        return req.json()
-    def search(self, query, maxcards=1000):
-        """Returns the results of a Scryfall search. For query syntax see
-        https://scryfall.com/docs/syntax. The maxcards keyword is used to
-        ensure that the amount of data pulled does not overload memory."""
+        passed to requests.request(). Responses already in the cache are
+        returned directly, without contacting the server (unless cached is
+        False)."""
+        params = kwargs.get('params', kwargs.get('json'))
+        cached = cached and self.cache
+        if cached:
+            js = self.cache.get(uri, params)
+            if js is not None: return js
+        # Wait for the shared rate limiter (only sleeps if requests are being
+        # sent faster than Scryfall asks).
+        Metrics.observe('scryfall.rate_limit_wait', self.limiter.acquire())
+        with Metrics.timer('scryfall.request'):
+            req = self.get_session().request(method, uri, **kwargs)
+            js = req.json()
+        # Only successful responses are stored (errors may be transient)
+        if cached and js.get('object') != 'error':
+            self.cache.put(uri, js, params)
+        return js
+    def fetch_cards(self, identifiers, batchsize=75):
+        """Requests the cards for a list of identifiers (dictionaries such as
+        {'name':..., 'set':...}, see https://scryfall.com/docs/api/cards/
+        collection) in batches of up to 75, the most Scryfall allows per
+        request. Returns the list of raw card dictionaries found, and the list
+        of identifiers that were not. (Responses are never taken from the
+        cache, since these are used to refresh card data.)"""
+        uri = f'{self.apipath}/cards/collection'
+        cards = []; missing = []
+        for i in range(0, len(identifiers), batchsize):
+            js = self.request(uri, method='POST', cached=False,
+                json={'identifiers':identifiers[i:i+batchsize]})
+            if js.get('object') == 'error':
+                print(f"Warning: Scryfall error --- {js.get('details')}")
+                missing += identifiers[i:i+batchsize]; continue
+            cards += js.get('data', []); missing += js.get('not_found', [])
+        return cards, missing
+    def iter_pages(self, query, maxcards=1000, prefetch=True):
+        """Yields the pages (lists of raw card dictionaries) of a Scryfall
+        search as they arrive. With prefetch, the pages are requested in a
+        background thread, so that the next page is already on its way while
+        the caller works on the current one."""
+        if not prefetch:
+            yield from self.fetch_pages(query, maxcards)
+            return
+        pages = queue.Queue(maxsize=2); stop = threading.Event()
+        def put(item):
+            # Give up if the consumer has gone away
+            while not stop.is_set():
+                try: pages.put(item, timeout=0.1); return True
+                except queue.Full: continue
+            return False
+        def fetch():
+            try:
+                for page in self.fetch_pages(query, maxcards):
+                    if not put(page): return
+                put(None)
+            except Exception as error: put(error)
+        thread = threading.Thread(target=fetch, daemon=True); thread.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None: break
+                if isinstance(page, Exception): raise page
+                yield page
+        finally: stop.set()
+    def fetch_pages(self, query, maxcards=1000):
+        """Requests the pages of a Scryfall search one after another, yielding
+        each list of raw card dictionaries. (maxcards=None pulls every
+        page.)"""
         # Pull the first page of search results from the scryfall API:
         js = self.request(self.searchpath, params={'q':query})
         # escape if the search results are empty, otherwise pull data
-        if 'data' not in js.keys(): return []
-        data = js['data']; ncards = len(data)
+        if 'data' not in js.keys(): return
+        yield js['data']; ncards = len(js['data'])
         # Pull from the next pages in the list while there are more pages AND
         # the maximum number of cards has not been reached:
-        while ('next_page' in js.keys()) and (ncards < maxcards):
+        while ('next_page' in js.keys()) and \
+                (maxcards is None or ncards < maxcards):
             # request the next_page using the provided uri:
             js = self.request(js['next_page'])
-            # concatenate into the data and recount the number of cards:
-            data += js['data']; ncards = len(data)
+            yield js['data']; ncards += len(js['data'])
         # Throw a warning if the above loop terminated due maxing out cards:
         if ('next_page' in js.keys()):
             print("Warning: Some cards were not pulled --- maxcards reached.")
-        # Format the restults into to pass to the Collection:
-        return self.format_result(data)
-#        return data
+    def iter_search(self, query, maxcards=1000, prefetch=True):
+        """Yields the results of a Scryfall search one page at a time, each
+        formatted as a Collection-compatible DataFrame. The raw json of each
+        page is discarded once it is formatted, so memory use stays bounded
+        by the page size however many cards the search returns."""
+        for page in self.iter_pages(query, maxcards, prefetch):
+            yield self.format_result(page)
+    def search(self, query, maxcards=1000, prefetch=True):
+        """Returns the results of a Scryfall search. For query syntax see
+        https://scryfall.com/docs/syntax. The maxcards keyword is used to
+        ensure that the amount of data pulled does not overload memory. Each
+        page is formatted as soon as it arrives, while the next is fetched."""
+        frames = list(self.iter_search(query, maxcards, prefetch))
+        # Return an empty list if the search results are empty
+        if not frames: return []
+        # Combine the formatted pages to pass to the Collection:
+        return pd.concat(frames, ignore_index=True)
         
 if __name__ == '__main__':
     